@@ -0,0 +1,285 @@
+"""
+    Benchmarks of the labs with fixed seeds. Results are printed and optionally
+    written as JSON, so that they can be compared between commits:
+
+        python benchmark.py --output before.json
+        python benchmark.py --only nim_duel rastrigin_one_lambda
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+from time import perf_counter
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for lab in ("lab1", "lab2", "lab3", "solving-rastrigin"):
+    sys.path.append(os.path.join(ROOT, lab))
+
+SEED = 42
+BENCHMARKS = dict()
+
+
+def benchmark(function):
+    """ Registers a benchmark, it must return a dict of JSON serializable measures """
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+@benchmark
+def lab1_search() -> dict:
+    """ Node expansions/sec of solution.search with A* on bitset states """
+    import solution
+    results = dict()
+    for n in (10, 20):
+        problem_ = solution.problem(n, seed=SEED)
+        state_cost = dict()
+        heuristic = solution.gen_bitset_ratio_h(n)
+        possible_actions = solution.gen_bitset_possible_actions(problem_)
+        expanded = 0
+
+        def counting_actions(state):
+            nonlocal expanded
+            expanded += 1
+            return possible_actions(state)
+
+        start = perf_counter()
+        final = solution.search(
+            solution.BitsetState(),
+            goal_test=solution.gen_bitset_goal_test(n),
+            possible_actions=counting_actions,
+            state_cost=state_cost,
+            priority_function=lambda state: state_cost[state] + heuristic(state),
+            unit_cost=solution.bitset_cost,
+            result=solution.gen_bitset_result(problem_),
+        )
+        elapsed = perf_counter() - start
+        results[f"N={n}"] = {
+            "cost": state_cost[final],
+            "expanded": expanded,
+            "seconds": elapsed,
+            "expansions_per_second": expanded / elapsed,
+        }
+    return results
+
+
+@benchmark
+def lab1_beam() -> dict:
+    """ Node expansions/sec of a width 10 beam search on the largest instance """
+    import solution
+    from search import beam_search
+    n = 1_000
+    problem_ = solution.problem(n, seed=SEED)
+    start = perf_counter()
+    result = beam_search(
+        solution.BitsetState(),
+        goal_test=solution.gen_bitset_goal_test(n),
+        possible_actions=solution.gen_bitset_possible_actions(problem_),
+        unit_cost=solution.bitset_cost,
+        h=solution.gen_bitset_ratio_h(n),
+        width=10,
+        result=solution.gen_bitset_result(problem_),
+    )
+    elapsed = perf_counter() - start
+    return {f"N={n}": {"cost": result.cost, "expanded": result.expanded, "seconds": elapsed, "expansions_per_second": result.expanded / elapsed}}
+
+
+@benchmark
+def lab2_fitness() -> dict:
+    """ Fitness evaluations/sec of the per-genome and the population fitness """
+    import genetic
+    results = dict()
+    for n in (100, 1_000):
+        P = genetic.pruned_problem(genetic.problem(n, seed=SEED))
+        rand = np.random.default_rng(SEED)
+        fitness = genetic.gen_fitness(P)
+        genomes = [genetic.Genome(frozenset(np.flatnonzero(rand.random(len(P)) < .3).tolist()), len(P)) for _ in range(200)]
+        start = perf_counter()
+        for genome in genomes:
+            fitness(genome)
+        per_genome = len(genomes) / (perf_counter() - start)
+        population = genetic.fitness_throughput(genetic.gen_population_fitness(P), len(P), rand)
+        results[f"N={n}"] = {"genome_evals_per_second": per_genome, "population_evals_per_second": population}
+    return results
+
+
+@benchmark
+def lab2_time_to_target() -> dict:
+    """ Seconds and evaluations needed by run_generations to reach a valid solution of the target weight """
+    import genetic
+    from controller import RunController
+    results = dict()
+    for n, target in ((100, 200), (1_000, 3_900)):
+        P = genetic.pruned_problem(genetic.problem(n, seed=SEED))
+        rand = np.random.default_rng(SEED)
+        # a valid solution has n distinct elements, fitnesses are compared as tuples
+        controller = RunController(max_generations=3_000, target=(n, -target))
+        fitness = controller.counting(genetic.gen_fitness(P))
+        population = list(genetic.init_population(20, len(P), fitness, rand))
+        start = perf_counter()
+        population, best = genetic.run_generations(population, 3_000, 20, .8, 15, fitness, rand, controller)
+        results[f"N={n}"] = {
+            "target_weight": target,
+            "weight": -best.fitness[1],
+            "reached": controller.reached(),
+            "generations": controller.generation,
+            "evaluations": controller.evaluations,
+            "seconds": perf_counter() - start,
+        }
+    return results
+
+
+@benchmark
+def nim_duel() -> dict:
+    """ Games/sec of Duel.play between random players """
+    from game import Duel, Nim
+    from players import random_ply
+    results = dict()
+    for rows in (3, 5, 10):
+        random.seed(SEED)
+        games = 2_000
+        start = perf_counter()
+        for _ in range(games):
+            Duel(Nim(rows), random_ply, random_ply).play()
+        results[f"rows={rows}"] = {"games_per_second": games / (perf_counter() - start)}
+    return results
+
+
+@benchmark
+def nim_node() -> dict:
+    """ Children/sec of NimNode.nimming over all the positions reachable from Nim(rows) """
+    from game import NimNode
+    results = dict()
+    for rows in (5, 6):
+        start = perf_counter()
+        frontier, seen, children = [NimNode(rows)], {NimNode(rows)}, 0
+        while frontier:
+            node = frontier.pop()
+            for ply in node.possible_plies():
+                child = node.nimming(ply)
+                children += 1
+                if child not in seen:
+                    seen.add(child)
+                    frontier.append(child)
+        elapsed = perf_counter() - start
+        results[f"rows={rows}"] = {"positions": len(seen), "children": children, "children_per_second": children / elapsed}
+    return results
+
+
+@benchmark
+def nim_fitness() -> dict:
+    """ Games/sec of nim_fitness for an adaptive player against random_ply """
+    from evolved_agents import nim_fitness
+    from players import AdaptivePly, random_ply
+    random.seed(SEED)
+    np.random.seed(SEED)
+    rows, games = 5, 2_000
+    player = AdaptivePly(rows)
+    results = dict()
+    for lookup in (False, True):
+        random.seed(SEED)
+        start = perf_counter()
+        fitness = nim_fitness(AdaptivePly(rows, rules=player._rules, lookup=lookup), random_ply, rows=rows, n_games=games)
+        results[f"rows={rows}{' lookup' if lookup else ''}"] = {"fitness": fitness, "games_per_second": games / (perf_counter() - start)}
+    return results
+
+
+@benchmark
+def nim_batch_fitness() -> dict:
+    """ Games/sec of population_nim_fitness for a population of adaptive players against random_ply """
+    from batch import population_nim_fitness
+    from players import AdaptivePly, random_ply
+    random.seed(SEED)
+    np.random.seed(SEED)
+    rows, games = 5, 2_000
+    population = [AdaptivePly(rows) for _ in range(20)]
+    rng = np.random.default_rng(SEED)
+    start = perf_counter()
+    fitness = population_nim_fitness(population, random_ply, rows=rows, n_games=games, rng=rng)
+    elapsed = perf_counter() - start
+    return {f"rows={rows}": {"mean_fitness": float(fitness.mean()), "games_per_second": len(population) * games / elapsed}}
+
+
+@benchmark
+def rastrigin_one_lambda() -> dict:
+    """ Fitness evaluations/sec of the self-adaptive one_lambda on rastrigin """
+    from problems import rastrigin
+    from self_adaptation import one_lambda
+    results = dict()
+    for strategy in (",", "+"):
+        lambda_, epochs = 1_000, 1_000
+        x0, sigma0 = np.full(2, 100.), np.full(2, 10.)
+        start = perf_counter()
+        best, _ = one_lambda(x0, sigma0, lambda_, rastrigin, epochs, seed=SEED, strategy=strategy)
+        elapsed = perf_counter() - start
+        results[f"strategy={strategy}"] = {
+            "fitness": float(rastrigin(best.parameters)),
+            "evals_per_second": lambda_ * epochs / elapsed,
+        }
+    return results
+
+
+@benchmark
+def rastrigin_cma() -> dict:
+    """ Evaluations needed to reach fitness -1e-8 by one_lambda and IPOP-CMA-ES (separable for d=1000) within 2e5 evaluations """
+    from cma import cma_es
+    from problems import rastrigin, sphere
+    from self_adaptation import one_lambda
+    budget, target, lambda_ = 200_000, -1e-8, 100
+    results = dict()
+    for name, problem in (("sphere", sphere), ("rastrigin", rastrigin)):
+        for d in (2, 10, 100, 1_000):
+            x0 = np.full(d, 3.)
+            start = perf_counter()
+            _, hist = one_lambda(x0, np.full(d, 2.), lambda_, problem, budget // lambda_, seed=SEED)
+            reached = next((1 + (epoch + 1) * lambda_ for one, epoch in hist if problem(one.parameters) >= target), None)
+            best = max((problem(one.parameters) for one, _ in hist), default=problem(x0))
+            one_lambda_seconds = perf_counter() - start
+            start = perf_counter()
+            solution, _ = cma_es(x0, 2., problem, budget, seed=SEED, separable=d > 100, restarts="ipop", target=target, max_evaluations=budget)
+            results[f"{name} d={d}"] = {
+                "one_lambda": {"evaluations_to_target": reached, "fitness": float(best), "seconds": one_lambda_seconds},
+                "cma": {
+                    "evaluations_to_target": solution.evaluations if solution.fitness >= target else None,
+                    "fitness": float(solution.fitness),
+                    "seconds": perf_counter() - start,
+                },
+            }
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", "-o", help="JSON file where results are written")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks to run, all by default")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = {"environment": environment(), "seed": SEED, "results": dict()}
+    for name in args.only or BENCHMARKS:
+        start = perf_counter()
+        report["results"][name] = BENCHMARKS[name]()
+        print(f"{name} ({perf_counter() - start:.1f}s)")
+        print(json.dumps(report["results"][name], indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
@@ -0,0 +1,89 @@
+from typing import Callable, Iterable
+import numpy as np
+
+
+def bits(mask: int):
+    """ Yields the positions of the bits set in mask """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class CoverageIndex:
+    """
+        Precomputed view of a set covering problem: duplicated, empty and
+        dominated lists are removed and an element -> lists inverted index is built.
+        A list is dominated when another one covers the same elements or more
+        at the same or lower cost. With the default cost=len a strict superset
+        always costs more, so only duplicated and empty lists are removed.
+    """
+
+    def __init__(self, problem_input: Iterable, cost: Callable = len) -> None:
+        unique = sorted({frozenset(list_) for list_ in problem_input if len(list_)}, key=sorted)
+        masks = [sum(1 << n for n in list_) for list_ in unique]
+        costs = [cost(list_) for list_ in unique]
+        self.N = max(max(list_) for list_ in unique) + 1 if unique else 0
+
+        if cost is len:
+            # no list can be dominated, skip the test
+            keep = range(len(unique))
+        else:
+            candidates = dict()
+            for i, list_ in enumerate(unique):
+                for n in list_:
+                    candidates.setdefault(n, list()).append(i)
+            keep = list()
+            for i, list_ in enumerate(unique):
+                # a dominating list must also contain the rarest element of list_
+                rarest = min(list_, key=lambda n: len(candidates[n]))
+                dominated = any(
+                    j != i and costs[j] <= costs[i] and masks[i] & ~masks[j] == 0
+                    for j in candidates[rarest]
+                )
+                if not dominated:
+                    keep.append(i)
+
+        self.lists = [tuple(sorted(unique[i])) for i in keep]
+        self.masks = [masks[i] for i in keep]
+        self.costs = [costs[i] for i in keep]
+        self.element_lists = dict()
+        for i, list_ in enumerate(self.lists):
+            for n in list_:
+                self.element_lists.setdefault(n, list()).append(i)
+        self._lists_per_element = sum(map(len, self.element_lists.values())) / max(1, len(self.element_lists))
+
+    def __len__(self) -> int:
+        return len(self.lists)
+
+    def covering(self, missing: int) -> list:
+        """ Returns the ids of the lists covering at least one element of the missing mask """
+        if missing.bit_count() * self._lists_per_element < len(self.lists):
+            ids = set()
+            for n in bits(missing):
+                ids.update(self.element_lists.get(n, ()))
+            return sorted(ids)
+        return [i for i, mask in enumerate(self.masks) if mask & missing]
+
+    def marginal_coverage(self, covered: int) -> list:
+        """ Returns (new elements, list id) of the useful lists, best first """
+        missing = ((1 << self.N) - 1) & ~covered
+        coverage = [((self.masks[i] & missing).bit_count(), i) for i in self.covering(missing)]
+        return sorted(coverage, key=lambda c: (-c[0], c[1]))
+
+    def lowest_cost_ratio(self, covered: int):
+        """ Returns the (cost, new elements) of the useful list paying the least per new element, None if there is none """
+        missing = ((1 << self.N) - 1) & ~covered
+        best_cost, best_new = None, 0
+        for i in self.covering(missing):
+            new = (self.masks[i] & missing).bit_count()
+            if best_cost is None or self.costs[i] * best_new < best_cost * new:
+                best_cost, best_new = self.costs[i], new
+        return None if best_cost is None else (best_cost, best_new)
+
+    def incidence(self) -> np.ndarray:
+        """ Returns the (lists, elements) boolean incidence matrix """
+        matrix = np.zeros((len(self.lists), self.N), dtype=bool)
+        for i, list_ in enumerate(self.lists):
+            matrix[i, list(list_)] = True
+        return matrix
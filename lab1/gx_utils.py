@@ -7,29 +7,71 @@ from collections import Counter
 
 
 class PriorityQueue:
-    """A basic Priority Queue with simple performance optimizations"""
+    """A Priority Queue with an item index, lazy deletion and decrease-key"""
 
-    def __init__(self):
+    _REMOVED = object()
+
+    def __init__(self, compaction_ratio=0.5):
         self._data_heap = list()
-        self._data_set = set()
+        self._entries = dict()
+        self._counter = 0
+        self._stale = 0
+        self._compaction_ratio = compaction_ratio
 
     def __bool__(self):
-        return bool(self._data_set)
+        return bool(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
 
     def __contains__(self, item):
-        return item in self._data_set
+        return item in self._entries
 
     def push(self, item, p=None):
         assert item not in self, f"Duplicated element"
         if p is None:
-            p = len(self._data_set)
-        self._data_set.add(item)
-        heapq.heappush(self._data_heap, (p, item))
+            p = len(self._entries)
+        entry = [p, self._counter, item]
+        self._counter += 1
+        self._entries[item] = entry
+        heapq.heappush(self._data_heap, entry)
+
+    def priority(self, item):
+        return self._entries[item][0]
+
+    def remove(self, item):
+        entry = self._entries.pop(item)
+        entry[2] = PriorityQueue._REMOVED
+        self._stale += 1
+        if self._stale > self._compaction_ratio * len(self._data_heap):
+            self._compact()
+
+    def update(self, item, p):
+        """Push item or change its priority, the old heap entry is invalidated lazily"""
+        if item in self._entries:
+            self.remove(item)
+        self.push(item, p)
+
+    def decrease_key(self, item, p):
+        """Lower the priority of item (pushing it if missing), returns True if the queue changed"""
+        if item in self._entries and self._entries[item][0] <= p:
+            return False
+        self.update(item, p)
+        return True
 
     def pop(self):
-        p, item = heapq.heappop(self._data_heap)
-        self._data_set.remove(item)
-        return item
+        while True:
+            p, _, item = heapq.heappop(self._data_heap)
+            if item is PriorityQueue._REMOVED:
+                self._stale -= 1
+            else:
+                del self._entries[item]
+                return item
+
+    def _compact(self):
+        self._data_heap = [e for e in self._data_heap if e[2] is not PriorityQueue._REMOVED]
+        heapq.heapify(self._data_heap)
+        self._stale = 0
 
 
 class Multiset:
@@ -0,0 +1,136 @@
+import heapq
+import logging
+from collections import namedtuple
+from itertools import count
+from math import inf
+from typing import Callable
+from gx_utils import PriorityQueue
+
+SearchResult = namedtuple("SearchResult", ["state", "cost", "expanded"])
+
+
+def expand(state, action):
+    """ Default transition: states are sets of actions """
+    return state.union([action])
+
+
+def weighted_a_star(
+    initial_state,
+    goal_test: Callable,
+    possible_actions: Callable,
+    unit_cost: Callable,
+    h: Callable,
+    weight: float = 1,
+    result: Callable = expand,
+) -> SearchResult:
+    """
+        A* with priority g + weight * h. With weight > 1 the solution
+        costs at most weight times the optimum, but far fewer nodes are expanded.
+    """
+    frontier = PriorityQueue()
+    state_cost = {initial_state: 0}
+    expanded = 0
+    state = initial_state
+    while state is not None and not goal_test(state):
+        expanded += 1
+        for a in possible_actions(state):
+            new_state = result(state, a)
+            cost = state_cost[state] + unit_cost(a)
+            if new_state not in state_cost or (new_state in frontier and cost < state_cost[new_state]):
+                state_cost[new_state] = cost
+                frontier.update(new_state, cost + weight * h(new_state))
+        state = frontier.pop() if frontier else None
+    return SearchResult(state, state_cost.get(state), expanded)
+
+
+def a_star(initial_state, goal_test: Callable, possible_actions: Callable, unit_cost: Callable, h: Callable, result: Callable = expand) -> SearchResult:
+    """ Optimal search, given an admissible heuristic """
+    return weighted_a_star(initial_state, goal_test, possible_actions, unit_cost, h, weight=1, result=result)
+
+
+def beam_search(
+    initial_state,
+    goal_test: Callable,
+    possible_actions: Callable,
+    unit_cost: Callable,
+    h: Callable,
+    width: int = 10,
+    weight: float = 1,
+    result: Callable = expand,
+) -> SearchResult:
+    """
+        Breadth-first search keeping only the `width` most promising states of each layer.
+        Memory is bounded by the width, the returned solution is not guaranteed to be optimal.
+    """
+    tie = count()
+    beam = [(0, initial_state)]
+    best_state, best_cost = None, inf
+    expanded = 0
+    while beam:
+        kept, kept_cost = list(), dict()
+        for g, state in beam:
+            if goal_test(state):
+                if g < best_cost:
+                    best_state, best_cost = state, g
+                continue
+            expanded += 1
+            for a in possible_actions(state):
+                cost = g + unit_cost(a)
+                if cost >= best_cost:
+                    continue
+                new_state = result(state, a)
+                if kept_cost.get(new_state, inf) <= cost:
+                    continue
+                f = cost + weight * h(new_state)
+                if f >= best_cost or (len(kept) >= width and -kept[0][0] <= f):
+                    continue
+                entry = (-f, next(tie), cost, new_state)
+                if len(kept) < width:
+                    heapq.heappush(kept, entry)
+                else:
+                    _, _, evicted_cost, evicted = heapq.heapreplace(kept, entry)
+                    if kept_cost.get(evicted) == evicted_cost:
+                        del kept_cost[evicted]
+                kept_cost[new_state] = cost
+        # a state may have been re-added with a lower cost, keep only its best entry
+        beam = [(g, s) for _, _, g, s in sorted(kept, reverse=True) if kept_cost.get(s) == g]
+        logging.debug(f"Beam layer with {len(beam)} states (best cost = {best_cost})")
+    return SearchResult(best_state, best_cost if best_state is not None else None, expanded)
+
+
+def ida_star(
+    initial_state,
+    goal_test: Callable,
+    possible_actions: Callable,
+    unit_cost: Callable,
+    h: Callable,
+    result: Callable = expand,
+    max_expansions: int = None,
+) -> SearchResult:
+    """
+        Iterative deepening A*: depth first searches bounded by increasing f thresholds.
+        Memory is linear in the depth of the solution. Stops early after max_expansions.
+    """
+    threshold = h(initial_state)
+    expanded = 0
+    while threshold < inf:
+        next_threshold = inf
+        stack = [(0, initial_state)]
+        while stack:
+            g, state = stack.pop()
+            f = g + h(state)
+            if f > threshold:
+                next_threshold = min(next_threshold, f)
+                continue
+            if goal_test(state):
+                return SearchResult(state, g, expanded)
+            expanded += 1
+            if max_expansions is not None and expanded >= max_expansions:
+                return SearchResult(None, None, expanded)
+            children = [(g + unit_cost(a), result(state, a)) for a in possible_actions(state)]
+            # most promising child on top of the stack
+            children.sort(key=lambda c: c[0] + h(c[1]), reverse=True)
+            stack.extend(children)
+        logging.debug(f"IDA* threshold raised from {threshold} to {next_threshold}")
+        threshold = next_threshold
+    return SearchResult(None, None, expanded)
@@ -1,13 +1,19 @@
 from gx_utils import *
+from search import beam_search, expand
+from coverage import CoverageIndex
 import numpy as np
 import logging
 import random
+from collections import namedtuple
+from functools import lru_cache
 from typing import Callable, Generator
 
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 
 RANDOM_SEED = 42
 PROBLEM_SIZE = [5, 10, 20, 100, 500, 1000] 
+EXACT_SEARCH_LIMIT = 20
+BEAM_WIDTH = 10
 
 def problem(N: int, seed=None):
     random.seed(seed)
@@ -23,6 +29,7 @@ def search(
     state_cost: dict, 
     priority_function: Callable,
     unit_cost: Callable,
+    result: Callable = expand,
 ):
     frontier = PriorityQueue()
     state_cost.clear()
@@ -33,11 +40,15 @@ def search(
     while state is not None and not goal_test(state):
         for a in possible_actions(state):
             new_state = result(state, a)
-            cost = unit_cost(a)
-            if new_state not in state_cost and new_state not in frontier:
-                state_cost[new_state] = state_cost[state] + cost
+            cost = state_cost[state] + unit_cost(a)
+            if new_state not in state_cost:
+                state_cost[new_state] = cost
                 frontier.push(new_state, p=priority_function(new_state))
-                logging.debug(f"Added new node to frontier (cost = {state_cost[new_state]})")
+                logging.debug(f"Added new node to frontier (cost = {cost})")
+            elif new_state in frontier and cost < state_cost[new_state]:
+                state_cost[new_state] = cost
+                frontier.update(new_state, p=priority_function(new_state))
+                logging.debug(f"Found cheaper path to frontier node (cost = {cost})")
         if frontier:
             state = frontier.pop()
         else:
@@ -94,29 +105,159 @@ def gen_h(N: int) -> Callable:
         return N - len(different_numbers)
     return h
 
-INITIAL_STATE = frozenset()
+BitsetAction = namedtuple("BitsetAction", ["bit", "covers", "cost"])
+
+class BitsetState:
+    """
+        Compact hashable state: the chosen lists are stored as an integer
+        bitmask and the mask of the covered numbers is cached on the state.
+        ratio is a lower bound (cost, new elements) on the cost paid per
+        newly covered number by any list added from this state on, it is
+        set once when the state is built and ignored by equality.
+    """
+    __slots__ = ("lists", "covered", "ratio", "_hash")
+
+    def __init__(self, lists: int = 0, covered: int = 0, ratio: tuple = (1, 1)) -> None:
+        self.lists = lists
+        self.covered = covered
+        self.ratio = ratio
+        # hash(int) is the value modulo 2**61 - 1, so masks differing by bits
+        # 61 positions apart would collide: hash the bytes of the mask instead
+        self._hash = hash(lists.to_bytes((lists.bit_length() + 7) // 8, "little"))
+
+    def union(self, actions: list, ratio: tuple = None) -> "BitsetState":
+        """
+            Returns the state reached by adding the given actions, without rebuilding
+            the covered mask. It inherits the ratio of this state unless one is given.
+        """
+        lists, covered = self.lists, self.covered
+        for action in actions:
+            lists |= action.bit
+            covered |= action.covers
+        return BitsetState(lists, covered, self.ratio if ratio is None else ratio)
+
+    def __contains__(self, action: BitsetAction) -> bool:
+        return bool(self.lists & action.bit)
+
+    def __len__(self) -> int:
+        return self.lists.bit_count()
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other) -> bool:
+        return self.lists == other.lists
+
+    def __lt__(self, other) -> bool:
+        return self.lists < other.lists
+
+    def __repr__(self) -> str:
+        return f"BitsetState(lists={self.lists:#x}, covered={self.covered:#x})"
+
+def gen_bitset_goal_test(N: int) -> Callable:
+    """Return a goal test on BitsetStates for the problem of size N"""
+    GOAL = (1 << N) - 1
+    def goal_test(state: BitsetState) -> bool:
+        """Test if the covered mask contains all numbers in [0, N-1]"""
+        return state.covered == GOAL
+    return goal_test
+
+def compile_bitset_actions(index: CoverageIndex) -> list:
+    """ Compiles each list of the index into a BitsetAction """
+    return [BitsetAction(1 << i, mask, cost) for i, (mask, cost) in enumerate(zip(index.masks, index.costs))]
+
+def gen_bitset_possible_actions(problem_input: list) -> Callable:
+    """
+        Returns a function that generates the useful actions for problem_input.
+        Duplicated lists are pruned once, then the element -> lists index
+        is used to only yield lists covering at least one missing element.
+    """
+    INDEX = CoverageIndex(problem_input)
+    ACTIONS = compile_bitset_actions(INDEX)
+    def possible_actions(state: BitsetState) -> list:
+        """
+           Returns the actions adding new elements to the given state,
+           best marginal coverage first
+        """
+        return [ACTIONS[i] for _, i in INDEX.marginal_coverage(state.covered)]
+    return possible_actions
+
+def gen_bitset_result(problem_input: list) -> Callable:
+    """
+        Returns the transition function on BitsetStates for problem_input. The
+        children get as ratio the lowest cost per new element of the lists useful
+        from their parent, computed once per parent.
+    """
+    INDEX = CoverageIndex(problem_input)
+    # the children of a state are generated one after the other
+    lowest_cost_ratio = lru_cache(maxsize=1)(INDEX.lowest_cost_ratio)
+    def result(state: BitsetState, action: BitsetAction) -> BitsetState:
+        # the action is useful, so the parent has a ratio
+        return state.union([action], lowest_cost_ratio(state.covered))
+    return result
+
+def gen_bitset_h(N: int) -> Callable:
+    """Returns the missing elements heuristic on BitsetStates for the problem of size N"""
+    def h(state: BitsetState) -> int:
+        """ Same heuristic as gen_h, computed as a popcount of the covered mask """
+        return N - state.covered.bit_count()
+    return h
+
+def gen_bitset_ratio_h(N: int) -> Callable:
+    """Returns a stronger heuristic on BitsetStates for the problem of size N"""
+    def h(state: BitsetState) -> int:
+        """
+            Returns the missing elements times the lowest cost per new element
+            the state was built with (see gen_bitset_result). That ratio can only
+            grow as more elements get covered, so the heuristic is still optimistic.
+        """
+        missing = N - state.covered.bit_count()
+        if not missing:
+            return 0
+        cost, new = state.ratio
+        return -(-missing * cost // new)
+    return h
+
+def bitset_cost(action: BitsetAction) -> int:
+    return action.cost
+
 state_cost = dict()
 
 
-for n in PROBLEM_SIZE:
-    problem_ = problem(n, seed=RANDOM_SEED)
+if __name__ == '__main__':
+    for n in PROBLEM_SIZE:
+        problem_ = problem(n, seed=RANDOM_SEED)
+
+        def dijkstra(state: BitsetState) -> int:
+            return state_cost[state]
+
+        heuristic = gen_bitset_ratio_h(n)
 
-    def dijkstra(state: frozenset) -> int:
-        return state_cost[state]
+        def A_star(state: BitsetState) -> int:
+            return dijkstra(state) + heuristic(state)
 
-    def A_star(state: frozenset) -> int:
-        heuristic = gen_h(n)
-        return dijkstra(state) + heuristic(state)
+        for priority_function in [A_star, dijkstra] if n <= EXACT_SEARCH_LIMIT else []:
+            logging.info(f"Starting search for N: {n:,} with {priority_function.__name__}:")
+            final = search(
+                BitsetState(),
+                goal_test=gen_bitset_goal_test(n),
+                possible_actions=gen_bitset_possible_actions(problem_),
+                state_cost=state_cost,
+                priority_function=priority_function,
+                # size of added list is the unit cost
+                unit_cost=bitset_cost,
+                result=gen_bitset_result(problem_),
+            )
+            logging.info(f"\tFound a solution with cost {state_cost[final]}\n\tvisited {len(state_cost):,} states")
 
-    for priority_function in [A_star, dijkstra]:
-        logging.info(f"Starting search for N: {n:,} with {priority_function.__name__}:")
-        final = search(
-            INITIAL_STATE,
-            goal_test=gen_goal_test(n),
-            possible_actions=gen_possible_actions(problem_),
-            state_cost=state_cost,
-            priority_function=priority_function,
-            # size of added list is the unit cost
-            unit_cost=len,
+        logging.info(f"Starting beam search for N: {n:,} with width {BEAM_WIDTH}:")
+        beam = beam_search(
+            BitsetState(),
+            goal_test=gen_bitset_goal_test(n),
+            possible_actions=gen_bitset_possible_actions(problem_),
+            unit_cost=bitset_cost,
+            h=heuristic,
+            width=BEAM_WIDTH,
+            result=gen_bitset_result(problem_),
         )
-        logging.info(f"\tFound a solution with cost {state_cost[final]}\n\tvisited {len(state_cost):,} states")
+        logging.info(f"\tFound a solution with cost {beam.cost}\n\texpanded {beam.expanded:,} states")
@@ -0,0 +1,100 @@
+import numpy as np
+from time import time
+from typing import Callable
+
+GENERATION_STATS = np.dtype([
+    ("generation", np.int32),
+    ("best_distinct", np.int32),
+    ("best_weight", np.int64),
+    ("mean_distinct", np.float32),
+    ("mean_weight", np.float32),
+    ("diversity", np.float32),
+    ("evaluations", np.int64),
+    ("elapsed", np.float32),
+])
+
+
+class RunController:
+    """
+        Stops a run when any budget (generations, wall-clock seconds, fitness evaluations)
+        is exhausted, when the best fitness reached the target or when it stagnated for
+        `patience` generations and no restarts are left. Per-generation statistics are
+        stored in a structured array.
+    """
+
+    def __init__(
+        self,
+        max_generations: int = None,
+        time_budget: float = None,
+        max_evaluations: int = None,
+        patience: int = None,
+        max_restarts: int = 0,
+        target: tuple = None,
+    ) -> None:
+        self.max_generations = max_generations
+        self.time_budget = time_budget
+        self.max_evaluations = max_evaluations
+        self.patience = patience
+        self.max_restarts = max_restarts
+        self.target = target
+        self.restarts = 0
+        self.generation = 0
+        self.evaluations = 0
+        self._start = time()
+        self._best = None
+        self._last_improvement = 0
+        self._stats = np.zeros(64, dtype=GENERATION_STATS)
+
+    def counting(self, fitness: Callable) -> Callable:
+        """ Wraps fitness so that every call is counted as an evaluation """
+        def counted_fitness(*args, **kwargs):
+            self.evaluations += 1
+            return fitness(*args, **kwargs)
+        return counted_fitness
+
+    @property
+    def elapsed(self) -> float:
+        return time() - self._start
+
+    def record(self, best: tuple, fitnesses: np.ndarray, diversity: float) -> None:
+        """ Stores the stats of the current generation, fitnesses is a (population, 2) array of fitness tuples """
+        if self._best is None or best > self._best:
+            self._best = best
+            self._last_improvement = self.generation
+        if self.generation >= len(self._stats):
+            self._stats = np.resize(self._stats, 2 * len(self._stats))
+        mean_distinct, mean_weight = fitnesses.mean(axis=0)
+        self._stats[self.generation] = (
+            self.generation, best[0], -best[1], mean_distinct, -mean_weight, diversity, self.evaluations, self.elapsed
+        )
+        self.generation += 1
+
+    @property
+    def stats(self) -> np.ndarray:
+        return self._stats[:self.generation]
+
+    def reached(self) -> bool:
+        return self.target is not None and self._best is not None and self._best >= self.target
+
+    def stagnating(self) -> bool:
+        return self.patience is not None and self.generation - self._last_improvement >= self.patience
+
+    def should_restart(self) -> bool:
+        """ True when the run stagnated and a restart is still available, the stagnation counter is then reset """
+        if self.stagnating() and self.restarts < self.max_restarts:
+            self.restarts += 1
+            self._last_improvement = self.generation
+            return True
+        return False
+
+    def exhausted(self) -> bool:
+        return (
+            (self.max_generations is not None and self.generation >= self.max_generations)
+            or (self.time_budget is not None and self.elapsed >= self.time_budget)
+            or (self.max_evaluations is not None and self.evaluations >= self.max_evaluations)
+            or self.reached()
+            or self.stagnating()
+        )
+
+    def dump(self, path: str) -> None:
+        np.save(path, self.stats)
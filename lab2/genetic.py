@@ -1,10 +1,18 @@
 import logging
+import os
 import random
 import numpy as np
 import sys
-from collections import namedtuple, Counter
+from collections import namedtuple, OrderedDict
+from itertools import chain
 from typing import Callable, Generator
 from time import time 
+# the set covering index is shared with lab1
+LAB1 = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lab1")
+if LAB1 not in sys.path:
+    sys.path.append(LAB1)
+from coverage import CoverageIndex
+from controller import RunController
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 
 def problem(N: int, seed=None) -> np.ndarray:
@@ -14,23 +22,119 @@ def problem(N: int, seed=None) -> np.ndarray:
         for n in range(random.randint(N, N * 5))
     }), dtype=object)
 
+def pruned_problem(problem: np.ndarray) -> np.ndarray:
+    """ Removes duplicated lists using the lab1 coverage index """
+    lists = CoverageIndex(problem).lists
+    pruned = np.empty(len(lists), dtype=object)
+    pruned[:] = lists
+    return pruned
+
+# loci is a frozenset: genomes are never modified, operators return the parent genome
+# itself when they don't change any gene, otherwise they build a whole new frozenset
 Genome = namedtuple('Genome', ['loci', 'len']) 
 Individual = namedtuple('Individual', ['genome', 'fitness']) 
 
+def incidence_matrix(problem: np.ndarray) -> np.ndarray:
+    """ Compiles the problem into a boolean (lists, elements) incidence matrix """
+    n_elements = 1 + max(max(list_) for list_ in problem)
+    lists = np.repeat(np.arange(len(problem)), [len(list_) for list_ in problem])
+    elements = np.fromiter(chain.from_iterable(problem), dtype=np.intp, count=len(lists))
+    incidence = np.zeros((len(problem), n_elements), dtype=bool)
+    incidence[lists, elements] = True
+    return incidence
+
 def gen_fitness(problem: np.ndarray) -> Callable:
     """ Returns a fitness function based on  the given problem """
+    incidence = incidence_matrix(problem)
+    weights = incidence.sum(axis=1)
     def fitness(genome: Genome) -> tuple:
         """
             Evaluates the fitness of a given genome.
             The fitness is represented as the tuple:
             (# of distinct elements, minus # of elements)
         """
-        cnt = Counter()
-        for locus in genome.loci:
-            cnt.update(problem[locus])
-        return len(cnt), -cnt.total()
+        loci = np.fromiter(genome.loci, dtype=np.intp, count=len(genome.loci))
+        return int(incidence[loci].any(axis=0).sum()), -int(weights[loci].sum())
     return fitness
 
+def gen_population_fitness(problem: np.ndarray) -> Callable:
+    """ Returns a fitness function evaluating a whole population at once """
+    incidence = incidence_matrix(problem).astype(np.float32)
+    weights = incidence.sum(axis=1)
+    def population_fitness(genomes: np.ndarray) -> tuple:
+        """
+            Evaluates a (population, loci) boolean matrix of genomes with a single
+            matrix product, returns the arrays of distinct elements and minus weights
+        """
+        genomes = genomes.astype(np.float32)
+        distinct = np.count_nonzero(genomes @ incidence, axis=1)
+        return distinct, -(genomes @ weights).astype(np.int64)
+    return population_fitness
+
+def fitness_throughput(population_fitness: Callable, n_loci: int, rand: np.random.Generator, size: int = 1_000) -> float:
+    """ Returns the fitness evaluations per second on a random population of the given size """
+    genomes = rand.random((size, n_loci)) < rand.random((size, 1))
+    start = time()
+    population_fitness(genomes)
+    return size / (time() - start)
+
+class FitnessCache:
+    """
+        Bounded genome key -> fitness cache. With the 'lru' policy hits refresh
+        an entry, with 'fifo' the oldest inserted entry is evicted first.
+    """
+    def __init__(self, maxsize: int = 2 ** 16, policy: str = 'lru') -> None:
+        assert policy in ('lru', 'fifo'), f"Unknown eviction policy {policy}"
+        self._data = OrderedDict()
+        self._maxsize = maxsize
+        self._policy = policy
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key):
+        """ Returns the cached fitness or None, updating the hit counters """
+        fitness = self._data.get(key)
+        if fitness is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            if self._policy == 'lru':
+                self._data.move_to_end(key)
+        return fitness
+
+    def put(self, key, fitness) -> None:
+        self._data[key] = fitness
+        if len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+def genome_key(genome: Genome) -> bytes:
+    """ Compact hashable key of a genome: its loci packed as a frozen bitset """
+    loci = np.zeros(genome.len, dtype=bool)
+    loci[list(genome.loci)] = True
+    return np.packbits(loci).tobytes()
+
+def cached(fitness: Callable, cache: FitnessCache, key: Callable = genome_key) -> Callable:
+    """ Wraps a genome fitness function with the given cache """
+    def cached_fitness(genome: Genome) -> tuple:
+        k = key(genome)
+        value = cache.get(k)
+        if value is None:
+            value = fitness(genome)
+            cache.put(k, value)
+        return value
+    return cached_fitness
+
 def init_population(
         population_size: int,
         problem_size: int,
@@ -43,44 +147,46 @@ def init_population(
     """
     def new_individual():
         positive_genes = rand.integers(problem_size + 1)
-        genome = Genome(set(rand.integers(problem_size, size = positive_genes)), problem_size)
+        genome = Genome(frozenset(rand.integers(problem_size, size = positive_genes).tolist()), problem_size)
         return Individual(genome, fitness(genome))
     return (new_individual() for _ in range(population_size))
 
 def flip_mutation(genome: Genome, rand: np.random.Generator) -> Genome:
     """ Flips n random  genes of the genome, where n ~ 1 + Pois(1). """
     n_flips = rand.poisson(1) + 1
-    for locus in rand.integers(genome.len, size = n_flips):
-        if locus in genome.loci:
-            genome.loci.remove(locus)
-        else:
-            genome.loci.add(locus)
-    return genome
+    flips = set()
+    for locus in rand.integers(genome.len, size = n_flips).tolist():
+        flips ^= {locus}
+    if not flips:
+        return genome
+    return Genome(genome.loci ^ flips, genome.len)
 
 def loseweight_mutation(genome: Genome, rand: np.random.Generator) -> Genome:
     """ Remove some positive genes """
     if genome.loci:
         max_drops = len(genome.loci)
-        drops = set(rand.choice(list(genome.loci), size=rand.integers(max_drops)))
-        new_loci = genome.loci - drops
-        genome = Genome(new_loci, genome.len)
+        drops = set(rand.choice(list(genome.loci), size=rand.integers(max_drops)).tolist())
+        if drops:
+            genome = Genome(genome.loci - drops, genome.len)
     return genome
 
 def rand_crossover(genome1: Genome, genome2: Genome, rand: np.random.Generator) -> Genome:
     """ For each locus chooses at random if the gene will come from either genome1 or genome2 """
-    new_loci = set()
-    for locus in sorted(genome1.loci | genome2.loci):
-        parent = random.choice([genome1, genome2])
-        if locus in parent.loci:
-            new_loci.add(locus)
-    return Genome(new_loci, genome1.len) 
+    if genome1.loci == genome2.loci:
+        return genome1
+    # loci of both parents are always inherited, the others half of the times
+    different = sorted(genome1.loci ^ genome2.loci)
+    inherited = (locus for locus, keep in zip(different, rand.random(len(different)) < .5) if keep)
+    return Genome((genome1.loci & genome2.loci).union(inherited), genome1.len) 
 
 def onecut_crossover(genome1: Genome, genome2: Genome, rand: np.random.Generator) -> Genome:
     """ Vanilla one cut crossover""" 
     split = rand.choice(genome1.len)
-    g1 = {locus for locus in genome1.loci if locus < split}
-    g2 = {locus for locus in genome2.loci if locus >= split}
-    return Genome(g1 | g2, genome1.len) 
+    if genome1.loci == genome2.loci:
+        return genome1
+    g1 = (locus for locus in genome1.loci if locus < split)
+    g2 = (locus for locus in genome2.loci if locus >= split)
+    return Genome(frozenset(chain(g1, g2)), genome1.len) 
 
 def tournament(population: list, size: int) -> Individual:
     """ Returns the best individual among 'size' random individuals of the given population """
@@ -107,34 +213,70 @@ def mutate_population(population: list, mutation_rate: float, fitness: Callable,
         if mutation_rate >= rand.random():
             mutation = rand.choice([flip_mutation, loseweight_mutation])
             genome = mutation(ind.genome, rand)
-            ind = Individual(genome, fitness(genome))
+            if genome is not ind.genome:
+                ind = Individual(genome, fitness(genome))
         return ind
     return (random_mutation(i) for i in population)
 
-def run_generations(population: list, n_generations: int, offspring_size: int, mutation_rate: float, selective_pressure: int) -> list: 
-    """ Pergorm the genetic algorithm with strategy one for n_generations with the given parameters"""
+def stale_individuals(population: list, fitness: Callable) -> list:
+    """ Returns the individuals whose stored fitness doesn't match their genome anymore """
+    return [i for i in population if i.fitness != fitness(i.genome)]
+
+def run_generations(
+        population: list,
+        n_generations: int,
+        offspring_size: int,
+        mutation_rate: float,
+        selective_pressure: int,
+        fitness: Callable,
+        rand: np.random.Generator,
+        controller: RunController = None
+    ) -> list: 
+    """
+        Pergorm the genetic algorithm with strategy one for n_generations with the given parameters.
+        A controller can stop the run earlier or restart it when the population stagnates,
+        keeping only the best individual. Per generation stats are recorded in the controller,
+        its budgets are shared by all the calls while n_generations limits only this one.
+    """
+    if controller is None:
+        controller = RunController()
     best_individual = max(population, key=lambda i: i.fitness)
-    for generation in range(n_generations):
-        offspring = [create_offspring(population, selective_pressure, mutation_rate, fitness, random_generator) for _ in range(offspring_size)]
-        population = list(mutate_population(population, mutation_rate, fitness, random_generator))
+    for _ in range(n_generations):
+        if controller.should_restart():
+            logging.debug(f"generation {controller.generation} restart")
+            population = [best_individual] + list(init_population(offspring_size - 1, best_individual.genome.len, fitness, rand))
+        if controller.exhausted():
+            break
+        offspring = [create_offspring(population, selective_pressure, mutation_rate, fitness, rand) for _ in range(offspring_size)]
+        population = list(mutate_population(population, mutation_rate, fitness, rand))
         population = sorted(population + offspring, key=lambda i: i.fitness, reverse=True)[:offspring_size]
         if population[0].fitness > best_individual.fitness:
             best_individual = population[0]
-            logging.debug(f"\rgeneration {generation} weight {-best_individual.fitness[1]}")
+            logging.debug(f"\rgeneration {controller.generation} weight {-best_individual.fitness[1]}")
+        diversity = len({i.genome.loci for i in population}) / len(population)
+        controller.record(best_individual.fitness, np.array([i.fitness for i in population]), diversity)
     return population, best_individual
 
-for N in [5, 10, 20, 100, 500, 1_000]:
-    SEED = 42
-    P = problem(N, seed = SEED)
-    random_generator = np.random.default_rng(SEED)
-    fitness = gen_fitness(P)
-    population = list(init_population(20, len(P), fitness, random_generator))
-    start = time()
-    population, best_individual = run_generations(population, 3000, 20, .8, 15) 
-    end = time()
-        
-    outcome = f"""For problem of size {N}:
+if __name__ == '__main__':
+    for N in [5, 10, 20, 100, 500, 1_000]:
+        SEED = 42
+        P = pruned_problem(problem(N, seed = SEED))
+        random_generator = np.random.default_rng(SEED)
+        cache = FitnessCache()
+        controller = RunController(max_generations=3000, patience=500, max_restarts=1)
+        fitness = cached(controller.counting(gen_fitness(P)), cache)
+        population = list(init_population(20, len(P), fitness, random_generator))
+        start = time()
+        population, best_individual = run_generations(population, 3000, 20, .8, 15, fitness, random_generator, controller) 
+        end = time()
+        assert not stale_individuals(population + [best_individual], gen_fitness(P)), "Stored fitness doesn't match the genome"
+
+        outcome = f"""For problem of size {N}:
      Found a {"valid" if best_individual.fitness[0] == N else "invalid"} solution
      with weight {-best_individual.fitness[1]:,}
-     in {end - start:.0f} seconds"""
-    logging.info(outcome) 
+     in {end - start:.0f} seconds
+     after {controller.generation:,} generations, {controller.evaluations:,} evaluations and {controller.restarts} restarts"""
+        logging.info(outcome)
+        logging.info(f"     fitness cache hit rate {cache.hit_rate:.1%} ({cache.hits:,} hits, {cache.misses:,} misses)")
+        evals_per_second = fitness_throughput(gen_population_fitness(P), len(P), random_generator)
+        logging.info(f"     vectorized fitness: {evals_per_second:,.0f} evaluations/sec")
@@ -0,0 +1,99 @@
+import logging
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+from genetic import problem, pruned_problem, gen_population_fitness
+from population import Population, run_generations
+
+logging.basicConfig(format="%(message)s", level=logging.INFO)
+
+_fitness = None
+
+
+def _init_worker(problem: np.ndarray) -> None:
+    """ Compiles the fitness once per worker process, closures can't be sent to the pool """
+    global _fitness
+    _fitness = gen_population_fitness(problem)
+
+
+def _evolve(island: Population, rand: np.random.Generator, n_generations: int, offspring_size: int, mutation_rate: float, selective_pressure: int) -> tuple:
+    island, best = run_generations(island, n_generations, offspring_size, mutation_rate, selective_pressure, _fitness, rand)
+    return island, rand, best
+
+
+def island_generators(seed: int, n_islands: int) -> list:
+    """ Independent and reproducible random generators, one for each island """
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n_islands)]
+
+
+def migrate(islands: list, n_migrants: int) -> list:
+    """ Ring migration: the best n_migrants of each island replace the worst ones of the next island """
+    if n_migrants <= 0 or len(islands) < 2:
+        return list(islands)
+    emigrants = [island.select(n_migrants) for island in islands]
+    migrated = list()
+    for i, island in enumerate(islands):
+        survivors = island.select(len(island) - n_migrants)
+        migrated.append(survivors + emigrants[i - 1])
+    return migrated
+
+
+def run_islands(
+    problem: np.ndarray,
+    n_islands: int,
+    population_size: int,
+    n_generations: int,
+    migration_interval: int,
+    n_migrants: int,
+    seed: int,
+    mutation_rate: float = .8,
+    selective_pressure: int = 15,
+    target_weight: int = None,
+    max_workers: int = None,
+) -> tuple:
+    """
+        Island model: every island evolves in its own process for migration_interval generations,
+        then the elites migrate along a ring. Stops after n_generations or as soon as a valid
+        solution with weight at most target_weight is found.
+        Returns the best genome, its fitness and the number of generations run.
+    """
+    rands = island_generators(seed, n_islands)
+    fitness = gen_population_fitness(problem)
+    n_elements = int(fitness(np.ones((1, len(problem)), dtype=bool))[0][0])
+    islands = [Population.random(population_size, len(problem), fitness, rand) for rand in rands]
+    best_genome, best_fitness = None, (-1, 0)
+    generation = 0
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(problem,)) as executor:
+        while generation < n_generations:
+            epoch = min(migration_interval, n_generations - generation)
+            futures = [
+                executor.submit(_evolve, island, rand, epoch, population_size, mutation_rate, selective_pressure)
+                for island, rand in zip(islands, rands)
+            ]
+            islands, rands, bests = zip(*(f.result() for f in futures))
+            generation += epoch
+            for genome, fit in bests:
+                if fit > best_fitness:
+                    best_genome, best_fitness = genome, fit
+            logging.debug(f"generation {generation} weight {-best_fitness[1]}")
+            if target_weight is not None and best_fitness[0] == n_elements and -best_fitness[1] <= target_weight:
+                break
+            islands = migrate(islands, n_migrants)
+    return best_genome, best_fitness, generation
+
+
+if __name__ == '__main__':
+    N = 1_000
+    SEED = 42
+    P = pruned_problem(problem(N, seed = SEED))
+    n_islands = os.cpu_count()
+    for islands in sorted({1, n_islands}):
+        start = time()
+        _, best_fitness, generations = run_islands(P, islands, 200, 300, 25, 10, SEED, target_weight=3_600)
+        end = time()
+        outcome = f"""For problem of size {N} with {islands} islands:
+     Found a {"valid" if best_fitness[0] == N else "invalid"} solution
+     with weight {-best_fitness[1]:,}
+     in {generations} generations and {end - start:.0f} seconds"""
+        logging.info(outcome)
@@ -0,0 +1,194 @@
+import logging
+import numpy as np
+from typing import Callable
+from time import time
+from genetic import problem, pruned_problem, gen_population_fitness, FitnessCache
+
+logging.basicConfig(format="%(message)s", level=logging.INFO)
+
+
+class Population:
+    """ Population stored as a (size, loci) boolean matrix along with its fitness arrays """
+
+    def __init__(self, genomes: np.ndarray, distinct: np.ndarray, weight: np.ndarray) -> None:
+        self.genomes = genomes
+        self.distinct = distinct
+        self.weight = weight
+
+    @staticmethod
+    def evaluate(genomes: np.ndarray, fitness: Callable) -> "Population":
+        return Population(genomes, *fitness(genomes))
+
+    @staticmethod
+    def random(size: int, n_loci: int, fitness: Callable, rand: np.random.Generator) -> "Population":
+        """ Each genome has its own density of positive genes, distributed uniformly """
+        genomes = rand.random((size, n_loci)) < rand.random((size, 1))
+        return Population.evaluate(genomes, fitness)
+
+    def __len__(self) -> int:
+        return len(self.genomes)
+
+    def __add__(self, other: "Population") -> "Population":
+        return Population(
+            np.concatenate((self.genomes, other.genomes)),
+            np.concatenate((self.distinct, other.distinct)),
+            np.concatenate((self.weight, other.weight)),
+        )
+
+    def __getitem__(self, index) -> "Population":
+        return Population(self.genomes[index], self.distinct[index], self.weight[index])
+
+    def fitness(self, i: int) -> tuple:
+        """ Fitness of the i-th individual as the (# of distinct elements, minus # of elements) tuple """
+        return int(self.distinct[i]), int(self.weight[i])
+
+    def key(self) -> np.ndarray:
+        """ Scalar key sorting individuals as the lexicographic order of their fitness tuples """
+        scale = 1 - int(self.weight.min(initial=0))
+        return self.distinct.astype(np.int64) * scale + self.weight
+
+    def best(self) -> int:
+        return int(np.argmax(self.key()))
+
+    def tournament(self, n: int, size: int, rand: np.random.Generator) -> np.ndarray:
+        """ Returns the indices of the winners of n tournaments among 'size' random individuals """
+        partecipants = rand.integers(len(self), size=(n, size))
+        winners = np.argmax(self.key()[partecipants], axis=1)
+        return partecipants[np.arange(n), winners]
+
+    def select(self, k: int) -> "Population":
+        """ Returns the k fittest individuals, unsorted """
+        if k >= len(self):
+            return self
+        return self[np.argpartition(-self.key(), k - 1)[:k]]
+
+
+def cached_population(population_fitness: Callable, cache: FitnessCache) -> Callable:
+    """ Wraps a population fitness function with the given cache, keyed by the packed bits of each genome """
+    def cached_population_fitness(genomes: np.ndarray) -> tuple:
+        keys = [row.tobytes() for row in np.packbits(genomes, axis=1)]
+        distinct = np.empty(len(genomes), dtype=np.int64)
+        weight = np.empty(len(genomes), dtype=np.int64)
+        missing = list()
+        for i, key in enumerate(keys):
+            value = cache.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                distinct[i], weight[i] = value
+        if missing:
+            distinct[missing], weight[missing] = population_fitness(genomes[missing])
+            for i in missing:
+                cache.put(keys[i], (distinct[i], weight[i]))
+        return distinct, weight
+    return cached_population_fitness
+
+
+def flip_mutation(genomes: np.ndarray, rand: np.random.Generator) -> np.ndarray:
+    """ Flips n random genes of each genome, where n ~ 1 + Pois(1). """
+    n_genomes, n_loci = genomes.shape
+    n_flips = rand.poisson(1, size=n_genomes) + 1
+    loci = rand.integers(n_loci, size=(n_genomes, n_flips.max(initial=1)))
+    flipped = np.arange(loci.shape[1]) < n_flips[:, None]
+    genomes = genomes.copy()
+    rows = np.broadcast_to(np.arange(n_genomes)[:, None], loci.shape)
+    np.logical_xor.at(genomes, (rows[flipped], loci[flipped]), True)
+    return genomes
+
+
+def loseweight_mutation(genomes: np.ndarray, rand: np.random.Generator) -> np.ndarray:
+    """ Removes each positive gene with a probability drawn uniformly for each genome """
+    drop = rand.random(genomes.shape) < rand.random((len(genomes), 1))
+    return genomes & ~drop
+
+
+def rand_crossover(genomes1: np.ndarray, genomes2: np.ndarray, rand: np.random.Generator) -> np.ndarray:
+    """ For each locus chooses at random if the gene will come from either genome1 or genome2 """
+    return np.where(rand.random(genomes1.shape) < 0.5, genomes1, genomes2)
+
+
+def onecut_crossover(genomes1: np.ndarray, genomes2: np.ndarray, rand: np.random.Generator) -> np.ndarray:
+    """ Vanilla one cut crossover """
+    split = rand.integers(genomes1.shape[1], size=(len(genomes1), 1))
+    return np.where(np.arange(genomes1.shape[1]) < split, genomes1, genomes2)
+
+
+def mutate(genomes: np.ndarray, mutation_rate: float, rand: np.random.Generator) -> tuple:
+    """ Applies a random mutation to each genome with a chance equal to the mutation rate, returns the mutated rows too """
+    mutated = rand.random(len(genomes)) < mutation_rate
+    flip = rand.random(len(genomes)) < 0.5
+    genomes = genomes.copy()
+    for mutation, rows in ((flip_mutation, mutated & flip), (loseweight_mutation, mutated & ~flip)):
+        if rows.any():
+            genomes[rows] = mutation(genomes[rows], rand)
+    return genomes, mutated
+
+
+def create_offspring(population: Population, size: int, selective_pressure: int, mutation_rate: float, fitness: Callable, rand: np.random.Generator) -> Population:
+    """
+        Selects the parents with tournaments, applies one of the crossovers to each couple
+        and then randomly mutates the new offspring.
+    """
+    parents1 = population.genomes[population.tournament(size, selective_pressure, rand)]
+    parents2 = population.genomes[population.tournament(size, selective_pressure, rand)]
+    genomes = np.where(
+        rand.random((size, 1)) < 0.5,
+        rand_crossover(parents1, parents2, rand),
+        onecut_crossover(parents1, parents2, rand),
+    )
+    genomes, _ = mutate(genomes, mutation_rate, rand)
+    return Population.evaluate(genomes, fitness)
+
+
+def mutate_population(population: Population, mutation_rate: float, fitness: Callable, rand: np.random.Generator) -> Population:
+    """ Mutate the individuals in the population with a chance equal to the mutation rate, only the mutated are re-evaluated """
+    genomes, mutated = mutate(population.genomes, mutation_rate, rand)
+    distinct, weight = population.distinct.copy(), population.weight.copy()
+    if mutated.any():
+        distinct[mutated], weight[mutated] = fitness(genomes[mutated])
+    return Population(genomes, distinct, weight)
+
+
+def run_generations(
+    population: Population,
+    n_generations: int,
+    offspring_size: int,
+    mutation_rate: float,
+    selective_pressure: int,
+    fitness: Callable,
+    rand: np.random.Generator,
+) -> tuple:
+    """ Same strategy as genetic.run_generations on array-backed populations, returns the population and the best genome with its fitness """
+    best = population.best()
+    best_genome, best_fitness = population.genomes[best], population.fitness(best)
+    for generation in range(n_generations):
+        offspring = create_offspring(population, offspring_size, selective_pressure, mutation_rate, fitness, rand)
+        population = mutate_population(population, mutation_rate, fitness, rand)
+        population = (population + offspring).select(offspring_size)
+        best = population.best()
+        if population.fitness(best) > best_fitness:
+            best_genome, best_fitness = population.genomes[best], population.fitness(best)
+            logging.debug(f"generation {generation} weight {-best_fitness[1]}")
+    return population, (best_genome, best_fitness)
+
+
+if __name__ == '__main__':
+    POPULATION_SIZE = 1_000
+    N_GENERATIONS = 300
+    for N in [5, 10, 20, 100, 500, 1_000]:
+        SEED = 42
+        P = pruned_problem(problem(N, seed = SEED))
+        random_generator = np.random.default_rng(SEED)
+        cache = FitnessCache(maxsize=POPULATION_SIZE * 20)
+        fitness = cached_population(gen_population_fitness(P), cache)
+        population = Population.random(POPULATION_SIZE, len(P), fitness, random_generator)
+        start = time()
+        population, (_, best_fitness) = run_generations(population, N_GENERATIONS, POPULATION_SIZE, .8, 15, fitness, random_generator)
+        end = time()
+
+        outcome = f"""For problem of size {N} with {POPULATION_SIZE:,} individuals:
+     Found a {"valid" if best_fitness[0] == N else "invalid"} solution
+     with weight {-best_fitness[1]:,}
+     in {end - start:.0f} seconds"""
+        logging.info(outcome)
+        logging.info(f"     fitness cache hit rate {cache.hit_rate:.1%} ({cache.hits:,} hits, {cache.misses:,} misses)")
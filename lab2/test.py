@@ -0,0 +1,22 @@
+import logging
+import random
+import numpy as np
+from genetic import problem, pruned_problem, gen_fitness, cached, FitnessCache, init_population, run_generations, stale_individuals
+
+logging.basicConfig(format="%(message)s", level=logging.INFO)
+SEEDS = [7, 42, 1234]
+N_GENERATIONS = 200
+
+if __name__ == '__main__':
+    logging.info("Test stored fitness matches the genome after a full run:")
+    for N in [20, 100]:
+        for seed in SEEDS:
+            random.seed(seed)
+            P = pruned_problem(problem(N, seed = seed))
+            random_generator = np.random.default_rng(seed)
+            fitness = cached(gen_fitness(P), FitnessCache())
+            population = list(init_population(20, len(P), fitness, random_generator))
+            population, best_individual = run_generations(population, N_GENERATIONS, 20, .8, 15, fitness, random_generator)
+            stale = stale_individuals(population + [best_individual], gen_fitness(P))
+            assert not stale, f"N = {N}, seed {seed}: {len(stale)} individuals with a stale fitness"
+            logging.info(f" - N = {N}, seed {seed}: ok, weight {-best_individual.fitness[1]:,}")
@@ -0,0 +1,202 @@
+import logging
+from collections import OrderedDict, namedtuple
+from time import perf_counter
+from typing import Callable
+from game import Nim, Nimply, Duel
+from players import random_ply
+
+logging.basicConfig(format="%(message)s", level=logging.INFO)
+
+# values are seen by the player to move: 1 won, -1 lost, evaluations must stay strictly in between
+WIN, LOSS = 1, -1
+EXACT, LOWER, UPPER = 0, 1, 2
+PROVEN = float("inf")
+
+TableEntry = namedtuple("TableEntry", "depth, value, flag, move")
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    """
+        Bounded position -> TableEntry table. With the 'depth' policy an entry is replaced only
+        by a search at least as deep, with 'always' the last search wins. When full the oldest
+        inserted position is evicted first.
+    """
+    def __init__(self, maxsize: int = 2 ** 20, policy: str = 'depth') -> None:
+        assert policy in ('depth', 'always'), f"Unknown replacement policy {policy}"
+        self._data = OrderedDict()
+        self._maxsize = maxsize
+        self._policy = policy
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key) -> TableEntry:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry: TableEntry) -> None:
+        old = self._data.get(key)
+        if old is not None and self._policy == 'depth' and old.depth > entry.depth:
+            return
+        self._data[key] = entry
+        if len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+
+def null_evaluation(rows: tuple, k: int, misere: bool) -> float:
+    """ Cut-off positions are unknown """
+    return 0.
+
+
+def nim_sum_evaluation(rows: tuple, k: int, misere: bool) -> float:
+    """ Guess from the nim-sum of the rows modulo k+1, exact only for normal play """
+    nim_sum = 0
+    for row in rows:
+        nim_sum ^= row if k is None else row % (k + 1)
+    return .5 if nim_sum else -.5
+
+
+class AlphaBetaPly:
+    """
+        Negamax with alpha-beta pruning on canonical positions (sorted non empty rows), for normal
+        and misère play and for moves capped at game.k objects. Iterative deepening stops when the
+        root is proven, at max_depth or when the time budget is over, positions at the depth limit
+        are scored by the evaluation hook.
+    """
+    def __init__(
+        self,
+        misere: bool = False,
+        max_depth: int = None,
+        time_budget: float = None,
+        evaluation: Callable = null_evaluation,
+        table: TranspositionTable = None,
+    ) -> None:
+        self.__name__ = "alphabeta_ply"
+        self._misere = misere
+        self._max_depth = max_depth
+        self._time_budget = time_budget
+        self._evaluation = evaluation
+        self.table = TranspositionTable() if table is None else table
+        self.nodes = 0
+        self._deadline = None
+        self._root_depth = None
+        self._root_move = None
+
+    def moves(self, rows: tuple, k: int, hint: tuple = None) -> list:
+        """ (row size, objects) moves, equal rows are tried once, the hint first then the biggest takes """
+        sizes = sorted(set(rows), reverse=True)
+        limit = max(sizes) if k is None else min(k, max(sizes))
+        moves = [(size, objects) for objects in range(limit, 0, -1) for size in sizes if objects <= size]
+        if hint is not None:
+            moves.remove(hint)
+            moves.insert(0, hint)
+        return moves
+
+    def negamax(self, rows: tuple, k: int, depth: int, alpha: float, beta: float) -> float:
+        self.nodes += 1
+        if self._deadline is not None and not self.nodes % 1024 and perf_counter() > self._deadline:
+            raise SearchTimeout()
+        if not rows:
+            # the previous player took the last object
+            return WIN if self._misere else LOSS
+        if depth == 0:
+            return self._evaluation(rows, k, self._misere)
+
+        key = (rows, k)
+        entry = self.table.get(key)
+        hint = None
+        if entry is not None:
+            hint = entry.move
+            if entry.depth >= depth:
+                if entry.flag == EXACT:
+                    if depth == self._root_depth:
+                        self._root_move = entry.move
+                    return entry.value
+                elif entry.flag == LOWER:
+                    alpha = max(alpha, entry.value)
+                else:
+                    beta = min(beta, entry.value)
+                if alpha >= beta:
+                    if depth == self._root_depth:
+                        self._root_move = entry.move
+                    return entry.value
+
+        original_alpha = alpha
+        best_value, best_move = -float("inf"), None
+        for size, objects in self.moves(rows, k, hint):
+            i = rows.index(size)
+            child = rows[:i] + rows[i+1:]
+            if size > objects:
+                # insert the reduced row keeping the rows sorted
+                j = i
+                while j and child[j-1] > size - objects:
+                    j -= 1
+                child = child[:j] + (size - objects,) + child[j:]
+            value = -self.negamax(child, k, depth - 1, -beta, -alpha)
+            if value > best_value:
+                best_value, best_move = value, (size, objects)
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        flag = UPPER if best_value <= original_alpha else LOWER if best_value >= beta else EXACT
+        proven = best_value in (WIN, LOSS) and flag == EXACT or (best_value == WIN and flag == LOWER) or (best_value == LOSS and flag == UPPER)
+        self.table.put(key, TableEntry(PROVEN if proven else depth, best_value, flag, best_move))
+        if depth == self._root_depth:
+            self._root_move = best_move
+        return best_value
+
+    def search(self, rows: tuple, k: int = None) -> tuple:
+        """ Iterative deepening from the given rows, returns the value, the (row size, objects) move and the depth reached """
+        rows = tuple(sorted(r for r in rows if r))
+        self._deadline = None if self._time_budget is None else perf_counter() + self._time_budget
+        max_depth = sum(rows) if self._max_depth is None else min(self._max_depth, sum(rows))
+        value, move, reached = 0., None, 0
+        # without a time budget the deepening would only repeat the shallower searches
+        depths = range(1, max_depth + 1) if self._deadline is not None else [max_depth]
+        for depth in depths:
+            self._root_depth = depth
+            try:
+                value = self.negamax(rows, k, depth, LOSS, WIN)
+            except SearchTimeout:
+                break
+            move, reached = self._root_move, depth
+            logging.debug("depth %d value %s move %s", depth, value, move)
+            if value in (WIN, LOSS):
+                break
+        if move is None:
+            # not even depth 1 was completed
+            move = self.moves(rows, k)[0]
+        return value, move, reached
+
+    def __call__(self, game: Nim) -> Nimply:
+        _, (size, objects), _ = self.search(game.rows, game.k)
+        return Nimply(game.rows.index(size), objects)
+
+
+if __name__ == '__main__':
+    for rows in (5, 6, 7, 8):
+        player = AlphaBetaPly()
+        start = perf_counter()
+        value, move, depth = player.search(Nim(rows).rows)
+        logging.info(f"Nim({rows}) value {value} move {move} in {perf_counter() - start:.2f}s, {player.nodes:,} nodes, table hit rate {player.table.hit_rate:.1%}")
+    player = AlphaBetaPly(time_budget=1, evaluation=nim_sum_evaluation)
+    value, move, depth = player.search(Nim(30).rows)
+    logging.info(f"Nim(30) value {value} move {move} reached depth {depth} in 1s")
+    misere_ply = AlphaBetaPly(misere=True, time_budget=1, evaluation=nim_sum_evaluation)
+    Duel(Nim(rows=(2, 4, 7), k=3), misere_ply, random_ply, visible=True, misere=True).play()
@@ -0,0 +1,158 @@
+"""
+    Batch plies take a (games, rows) array of running games, a random generator and
+    optionally, for each game, the index of the individual playing it. They return
+    the arrays of the rows and of the objects to remove, one move for each game.
+"""
+import numpy as np
+from typing import Callable
+from players import AdaptivePly, HybridPly, good_ply, hardcoded_ply, random_ply, top_ply
+
+
+def _first_nonzero(rows: np.ndarray) -> np.ndarray:
+    return np.argmax(rows > 0, axis=1)
+
+
+def batch_top_ply(rows: np.ndarray, rng: np.random.Generator, ids: np.ndarray = None) -> tuple:
+    """ nim-sum strategy """
+    games = np.arange(len(rows))
+    nim_sum = np.bitwise_xor.reduce(rows, axis=1)
+    target = rows ^ nim_sum[:, None]
+    valid = target < rows
+    has_move = valid.any(axis=1)
+    row = np.where(has_move, np.argmax(valid, axis=1), _first_nonzero(rows))
+    objects = np.where(has_move, rows[games, row] - target[games, row], 1)
+    return row, objects
+
+
+def batch_good_ply(rows: np.ndarray, rng: np.random.Generator, ids: np.ndarray = None) -> tuple:
+    """ Faulty nim-sum implementation, takes nim-sum to zero only if it can remove a whole row  """
+    games = np.arange(len(rows))
+    nim_sum = np.bitwise_xor.reduce(rows, axis=1)
+    masked = rows & nim_sum[:, None]
+    # max of the (objects & nim_sum, row) tuples: ties go to the last row
+    best = np.argmax(masked * rows.shape[1] + np.arange(rows.shape[1]), axis=1)
+    row = np.where(nim_sum > 0, best, _first_nonzero(rows))
+    objects = np.where(nim_sum > 0, masked[games, row], 1)
+    return row, objects
+
+
+def batch_random_ply(rows: np.ndarray, rng: np.random.Generator, ids: np.ndarray = None) -> tuple:
+    """ Uniformly random row among the non empty ones, then a random number of objects """
+    games = np.arange(len(rows))
+    row = np.argmax(rng.random(rows.shape) * (rows > 0), axis=1)
+    objects = (rng.random(len(rows)) * rows[games, row]).astype(rows.dtype) + 1
+    return row, objects
+
+
+def batch_hardcoded_ply(rows: np.ndarray, rng: np.random.Generator, ids: np.ndarray = None, default_ply: Callable = batch_random_ply) -> tuple:
+    """ Try to apply a hardcoded behaviour otherwise use a default ply """
+    games = np.arange(len(rows))
+    non_null = np.count_nonzero(rows, axis=1)
+    # max of the (objects, row) tuples: ties go to the last row
+    row = np.argmax(rows * rows.shape[1] + np.arange(rows.shape[1]), axis=1)
+    max_elems = rows[games, row]
+    min_elems = np.where(rows > 0, rows, max_elems[:, None]).min(axis=1)
+    ones = np.count_nonzero(rows == 1, axis=1)
+
+    single = non_null == 1
+    couple = non_null == 2
+    last_big = ~single & ~couple & (ones == non_null - 1)
+    objects = np.select(
+        [single, couple & (max_elems == min_elems), couple, last_big],
+        [max_elems, 1, max_elems - min_elems, np.where(non_null % 2, max_elems, max_elems - 1)],
+        0,
+    )
+    default = ~(single | couple | last_big)
+    if default.any():
+        row[default], objects[default] = default_ply(rows[default], rng, None if ids is None else ids[default])
+    return row, objects
+
+
+BATCH_PLIES = {
+    top_ply: batch_top_ply,
+    good_ply: batch_good_ply,
+    random_ply: batch_random_ply,
+    hardcoded_ply: batch_hardcoded_ply,
+}
+
+
+class BatchAdaptivePly:
+    """ Rules of many adaptive players stacked in (players, rules) arrays """
+    def __init__(self, players: list) -> None:
+        tables = np.stack([p.rule_table() for p in players])
+        self._row = tables[..., 0].astype(np.intp)
+        self._min = tables[..., 1]
+        self._max = tables[..., 2]
+        self._priority = tables[..., 3]
+        self._objects = tables[..., 4].astype(np.int64)
+
+    def __call__(self, rows: np.ndarray, rng: np.random.Generator, ids: np.ndarray = None) -> tuple:
+        games = np.arange(len(rows))
+        if ids is None:
+            ids = np.zeros(len(rows), dtype=np.intp)
+        rule_rows = self._row[ids]
+        elems = np.take_along_axis(rows, rule_rows, axis=1)
+        valid = (elems > 0) & (self._min[ids] < elems) & (elems < self._max[ids])
+        priority = self._priority[ids]
+        # valid rules first, then the highest priority, as the (valid, priority) tuples of AdaptivePly
+        rule = np.where(valid.any(axis=1), np.argmax(np.where(valid, priority, -np.inf), axis=1), np.argmax(priority, axis=1))
+        objects = np.minimum(np.maximum(1, self._objects[ids, rule]), elems[games, rule])
+        return rule_rows[games, rule], objects
+
+
+class BatchHybridPly:
+    """ Hybrid players sharing the same algorithmic ply, their adaptive plies are stacked """
+    def __init__(self, players: list) -> None:
+        self._algoritmic_ply = BATCH_PLIES[players[0]._algoritmic_ply]
+        self._adaptive_ply = BatchAdaptivePly([p._adaptive_ply for p in players])
+
+    def __call__(self, rows: np.ndarray, rng: np.random.Generator, ids: np.ndarray = None) -> tuple:
+        return self._algoritmic_ply(rows, rng, ids, default_ply=self._adaptive_ply)
+
+
+def batch_player(players) -> Callable:
+    """ Batch version of a ply, or of a list of adaptive or hybrid players of the same kind """
+    if not isinstance(players, (list, tuple)):
+        players = [players]
+    if isinstance(players[0], AdaptivePly):
+        return BatchAdaptivePly(players)
+    if isinstance(players[0], HybridPly):
+        return BatchHybridPly(players)
+    return BATCH_PLIES[players[0]]
+
+
+def simulate(individual: Callable, adversary: Callable, num_rows: int, starts: np.ndarray, ids: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+        Plays len(starts) games in lockstep between two batch plies, starts tells for each game
+        who moves first (0 the individual, 1 the adversary). Returns which games the individual won.
+    """
+    rows = np.tile(np.arange(num_rows, dtype=np.int64) * 2 + 1, (len(starts), 1))
+    mover = starts.astype(np.int8)
+    running = np.arange(len(starts))
+    while len(running):
+        for player, side in ((individual, 0), (adversary, 1)):
+            games = running[mover[running] == side]
+            if len(games):
+                row, objects = player(rows[games], rng, ids[games] if side == 0 else None)
+                rows[games, row] -= objects
+        mover[running] ^= 1
+        running = running[rows[running].any(axis=1)]
+    # the last player who moved won, the mover was already switched
+    return mover == 1
+
+
+def population_nim_fitness(population: list, adversary: Callable, rows: int = 3, n_games: int = 100, rng: np.random.Generator = None) -> np.ndarray:
+    """ Fraction of games won by each individual, as nim_fitness but for a whole population at once """
+    rng = np.random.default_rng() if rng is None else rng
+    games = np.arange(len(population) * n_games)
+    won = simulate(batch_player(population), batch_player(adversary), rows, (games % n_games) % 2, games // n_games, rng)
+    return won.reshape(len(population), n_games).mean(axis=1)
+
+
+def population_lexicase_fitness(population: list, adversaries: list = list(), rows: int = 3, n_games: list = list(), rng: np.random.Generator = None) -> np.ndarray:
+    """ (individuals, adversaries) array of the fraction of games won, as lexicase_nim_fitness """
+    rng = np.random.default_rng() if rng is None else rng
+    return np.stack([
+        population_nim_fitness(population, adversary, rows=rows, n_games=games, rng=rng)
+        for adversary, games in zip(adversaries, n_games)
+    ], axis=1)
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from itertools import chain
+from typing import Callable, Iterable
+from players import seed_generator
+
+BACKENDS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+
+def _evaluate(fitness: Callable, tasks: list) -> list:
+    """ Evaluates (seed, individual) tasks, each one with its own random stream """
+    fitnesses = list()
+    for seed, individual in tasks:
+        seed_generator(seed)
+        try:
+            fitnesses.append(fitness(individual))
+        finally:
+            seed_generator(None)
+    return fitnesses
+
+
+class Evaluator:
+    """
+        Population fitness spread over a serial, thread or process backend, it can be passed as
+        batch_fitness to the evaluators. Every individual plays with its own random stream, spawned
+        from the seed, so results are the same with any backend and number of workers.
+        Fitness and players must be picklable for the process backend (no lambdas, use partial).
+    """
+
+    def __init__(self, fitness: Callable, backend: str = "serial", max_workers: int = None, seed: int = None) -> None:
+        if backend != "serial" and backend not in BACKENDS:
+            raise ValueError(f"unknown backend {backend!r}, expected serial, {', '.join(BACKENDS)}")
+        self._fitness = fitness
+        self._seeds = np.random.SeedSequence(seed)
+        self.max_workers = 1 if backend == "serial" else max_workers or os.cpu_count() or 1
+        self._executor = None if backend == "serial" else BACKENDS[backend](self.max_workers)
+
+    def __call__(self, population: Iterable) -> list:
+        population = list(population)
+        seeds = [int(s.generate_state(1)[0]) for s in self._seeds.spawn(len(population))]
+        tasks = list(zip(seeds, population))
+        if self._executor is None:
+            return _evaluate(self._fitness, tasks)
+        # contiguous chunks, one per worker, so that each process receives the fitness only once
+        bounds = np.linspace(0, len(tasks), min(self.max_workers, len(tasks)) + 1).astype(int)
+        chunks = [tasks[start:end] for start, end in zip(bounds, bounds[1:])]
+        return list(chain.from_iterable(self._executor.map(partial(_evaluate, self._fitness), chunks)))
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self) -> "Evaluator":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
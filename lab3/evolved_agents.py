@@ -1,14 +1,21 @@
+import os
 import random
+import sys
 import numpy as np
 from typing import Callable, Iterable
 from functools import reduce
 from itertools import chain
-from game import Duel, Nim
+from game import play_games
+# the self-adaptive sampling is shared with solving-rastrigin
+RASTRIGIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "solving-rastrigin")
+if RASTRIGIN not in sys.path:
+    sys.path.append(RASTRIGIN)
+from self_adaptation import self_adaptive_offspring
 
 class SelfAdaptiveParameters:
     """ tweakable parameters using self-adaptation algorithm """
-    def __init__(self, initial_params: np.ndarray, sigma: np.ndarray, seed: int = None, step: int = 1) -> None:
-        self._generator = np.random.default_rng(0 if seed is None else seed)
+    def __init__(self, initial_params: np.ndarray, sigma: np.ndarray, seed: int = None, step: int = 1, generator: np.random.Generator = None) -> None:
+        self._generator = np.random.default_rng(0 if seed is None else seed) if generator is None else generator
         self._v = initial_params
         self._shape = initial_params.shape
         self._sigma = sigma
@@ -20,43 +27,61 @@ class SelfAdaptiveParameters:
         sigma = self._sigma * np.exp(tau * self._generator.normal(size = self._shape))
         value = self._generator.normal(loc=self._v, scale=self._sigma)
         return SelfAdaptiveParameters(value, sigma, seed=seed, step=self._step+1)
+
+    def offspring(self, lambda_: int, generator: np.random.Generator = None) -> list:
+        """ lambda_ tweaks sampled at once, the offspring share the generator """
+        generator = self._generator if generator is None else generator
+        values, sigmas = self_adaptive_offspring(self._v, self._sigma, self._step, lambda_, generator)
+        return [SelfAdaptiveParameters(v, s, step=self._step+1, generator=generator) for v, s in zip(values, sigmas)]
    
     def __getitem__(self, key: int | slice) -> float:
         return self._v[key]
 
-def one_lambda(initial: object, lambda_: int, evaluator: Callable, epochs: int) -> tuple:
-    """ (1, lambda) Evolutionary Search """
+def one_lambda(initial: object, lambda_: int, evaluator: Callable, epochs: int, seed: int = None, strategy: str = ',') -> tuple:
+    """
+        (1, lambda) or (1 + lambda) Evolutionary Search, the offspring of each epoch are sampled at once
+        from a single generator, seeded from numpy's global one when seed is None
+    """
+    generator = np.random.default_rng(np.random.randint(2 ** 31) if seed is None else seed)
     one = initial
     hist = list()
     for epoch in range(epochs):
-        tweaked = (one.tweak() for _ in range(lambda_))
+        tweaked = one.offspring(lambda_, generator)
+        if strategy in ['plus', '+']:
+            tweaked = chain(tweaked, [one])
         fit, one = evaluator(tweaked) 
         hist.append((fit, one))
     return one, hist
         
 def nim_fitness(individual: Callable, adversary: Callable, rows: int = 3,  n_games: int = 100) -> float:
-    wins = 0
-    for game_id in range(n_games):
-        game = Nim(rows)
-        if game_id % 2:
-            duel = Duel(game, adversary, individual)
-            wins += duel.play()
-        else:
-            duel = Duel(game, individual, adversary)
-            wins += 1 - duel.play()
-    return wins / n_games
+    return play_games(individual, adversary, rows, n_games) / n_games
 
 def lexicase_nim_fitness(individual: Callable, adversaries: Iterable[Callable] = list(), rows: int = 3, n_games: Iterable[int] = list()):
     return tuple((nim_fitness(individual, adversary, rows=rows, n_games=games) for adversary, games in zip(adversaries, n_games)))
     
-def lexicase_evaluator(population: Iterable, fitness: Callable = lexicase_nim_fitness, fit_dimensions: int = 1) -> tuple:
-    """ Given a population extract best individual using lexicase selection """
-    evaluated = ((fitness(i), i) for i in population)
+def lexicase_evaluator(population: Iterable, fitness: Callable = lexicase_nim_fitness, fit_dimensions: int = 1, batch_fitness: Callable = None) -> tuple:
+    """
+        Given a population extract best individual using lexicase selection.
+        batch_fitness, if given, evaluates the whole population at once returning an (individuals, fit_dimensions) array.
+    """
+    if batch_fitness is not None:
+        population = list(population)
+        evaluated = zip(map(tuple, batch_fitness(population)), population)
+    else:
+        evaluated = ((fitness(i), i) for i in population)
     shuffle = random.sample(range(fit_dimensions), fit_dimensions)
     fitness_shuffle = lambda f: tuple(f[i] for i in shuffle)
     return max(evaluated, key = lambda e: fitness_shuffle(e[0]))
 
-def scalar_evaluator(population: Iterable, fitness: Callable = nim_fitness) -> tuple:
-    """ Given a population extract most fit individual """
+def scalar_evaluator(population: Iterable, fitness: Callable = nim_fitness, batch_fitness: Callable = None) -> tuple:
+    """
+        Given a population extract most fit individual.
+        batch_fitness, if given, evaluates the whole population at once returning an array.
+    """
+    if batch_fitness is not None:
+        population = list(population)
+        fitnesses = batch_fitness(population)
+        best = int(np.argmax(fitnesses))
+        return fitnesses[best], population[best]
     return max(((fitness(i), i) for i in population), key = lambda e: e[0])
 
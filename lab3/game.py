@@ -1,24 +1,39 @@
 import logging
 from collections import namedtuple
 from typing import Callable, Generator
-from copy import deepcopy
 
 Nimply = namedtuple("Nimply", "row, num_objects")
 
 class Nim:
-    def __init__(self, num_rows: int) -> None:
-        self._rows = [i*2 + 1 for i in range(num_rows)]
+    """
+        Lean nim game: rows are kept in a tuple along with a running count of the objects left.
+        Rows default to 1, 3, 5, ... and k, if given, caps the objects removed by a single ply.
+    """
+    __slots__ = ("_rows", "_objects", "_k")
+
+    def __init__(self, num_rows: int = None, k: int = None, rows: tuple = None) -> None:
+        self._rows = tuple(i*2 + 1 for i in range(num_rows)) if rows is None else tuple(rows)
+        self._objects = sum(self._rows)
+        self._k = k
 
     def nimming(self, ply: Nimply) -> None:
-        assert self._rows[ply.row] >= ply.num_objects
-        self._rows[ply.row] -= ply.num_objects
+        row, num_objects = ply
+        rows = self._rows
+        assert rows[row] >= num_objects
+        assert self._k is None or num_objects <= self._k
+        self._rows = rows[:row] + (rows[row] - num_objects,) + rows[row+1:]
+        self._objects -= num_objects
     
     def __bool__(self) -> bool:
-        return sum(self._rows) > 0
+        return self._objects > 0
 
     @property
     def rows(self) -> tuple:
-        return tuple(self._rows)
+        return self._rows
+
+    @property
+    def k(self) -> int:
+        return self._k
 
     def __str__(self) -> str:
         out = ""
@@ -27,60 +42,102 @@ class Nim:
         return out
 
 class Duel:
-    def __init__(self, game: Nim, player0: Callable, player1: Callable, visible: bool = False) -> None:
+    """ Plays a game between two players, in misère play whoever takes the last object loses """
+    def __init__(self, game: Nim, player0: Callable, player1: Callable, visible: bool = False, misere: bool = False) -> None:
         self._game = game
         self._players  = [player0, player1]
         self._turn = 0
         self._visible = visible
+        self._misere = misere
 
-    def log(self, message: str) -> None:
-        if self._visible:
-            logging.info(message)
-        else:
-            logging.debug(message)
+    def log(self, message: str, *args) -> None:
+        """ Messages are formatted only if they are going to be emitted """
+        level = logging.INFO if self._visible else logging.DEBUG
+        if logging.getLogger().isEnabledFor(level):
+            logging.log(level, message, *args)
 
     def play(self) -> int:
         while self._game:
             player = self._players[self._turn]
-            self.log(f"Player {player.__name__} turn")
-            self.log(self._game)
+            self.log("Player %s turn", player.__name__)
+            self.log("%s", self._game)
             ply = player(self._game)
             self._game.nimming(ply)
             self._turn = 1 - self._turn
-        self.log(f"Player {player.__name__} won")
-        return 1 - self._turn 
+        winner = self._turn if self._misere else 1 - self._turn
+        self.log("Player %s won", self._players[winner].__name__)
+        return winner
+
+def play(game: Nim, player0: Callable, player1: Callable) -> int:
+    """ Plays a game without any logging, returns the index of the winner """
+    players = (player0, player1)
+    turn = 0
+    while game:
+        game.nimming(players[turn](game))
+        turn = 1 - turn
+    return 1 - turn
+
+def play_games(player: Callable, adversary: Callable, num_rows: int, n_games: int) -> int:
+    """
+        Plays n_games one after the other alternating the first player, returns the number of
+        games won by player. Games of many players are played at once on arrays by batch.py.
+    """
+    wins = 0
+    for game_id in range(n_games):
+        if game_id % 2:
+            wins += play(Nim(num_rows), adversary, player)
+        else:
+            wins += 1 - play(Nim(num_rows), player, adversary)
+    return wins
 
 class NimNode:
-    """ Compact hashable representation of the nim game """
+    """ Compact hashable representation of the nim game: the sorted non empty rows """
+    __slots__ = ("_rows", "_hash")
+
     def __init__(self, num_rows: int = 3, game: Nim = None) -> None:
         if game is None:
             self._rows = tuple(i*2 + 1 for i in range(num_rows))
         else:
             self._rows = tuple(sorted((o for o in game.rows if o)))
+        self._hash = hash(self._rows)
+
+    @staticmethod
+    def _from_sorted(rows: tuple) -> "NimNode":
+        node = NimNode.__new__(NimNode)
+        node._rows = rows
+        node._hash = hash(rows)
+        return node
 
     def nimming(self, ply: Nimply):
-        assert self._rows[ply.row] >= ply.num_objects
-        next_game = deepcopy(self)
-        next_rows = next_game._rows[:ply.row] + (next_game._rows[ply.row] - ply.num_objects,) + next_game._rows[ply.row+1:] 
-        next_rows = tuple(sorted((o for o in next_rows if o)))
-        next_game._rows = next_rows
-        return next_game
+        """ Child node in O(rows): the reduced row is moved left until the rows are sorted again """
+        row, num_objects = ply
+        rows = self._rows
+        assert rows[row] >= num_objects
+        left = rows[row] - num_objects
+        position = row
+        while position and rows[position-1] > left:
+            position -= 1
+        if left:
+            return NimNode._from_sorted(rows[:position] + (left,) + rows[position:row] + rows[row+1:])
+        return NimNode._from_sorted(rows[:row] + rows[row+1:])
 
     def possible_plies(self) -> Generator:
-        return (Nimply(r, o) for r, m in enumerate(self._rows) for o in range(1, m+1))
+        """ Plies on equal rows lead to the same node, only the first of those rows is used """
+        rows = self._rows
+        return (Nimply(r, o) for r, m in enumerate(rows) if not r or rows[r-1] != m for o in range(1, m+1))
 
     def __bool__(self) -> bool:
-        return sum(self._rows) > 0
+        return bool(self._rows)
 
     def __hash__(self) -> int:
-        return self._rows.__hash__()
+        return self._hash
 
     def __eq__(self, other) -> bool:
-        return self._rows == other.rows 
+        return self._rows == other._rows
 
     @property
     def rows(self) -> tuple:
-        return tuple(self._rows)
+        return self._rows
 
     def __str__(self) -> str:
         out = ""
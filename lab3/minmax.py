@@ -1,8 +1,10 @@
 import logging
+import os
 from collections import namedtuple
 from functools import cache
 from game import Nim, Nimply, Duel, NimNode, game_node_mapping
 from players import top_ply, human_ply
+from retrograde import SolvedTable, solved_table
 
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 
@@ -19,11 +21,35 @@ def nim_min_max(node: NimNode, turn: str = 'min') -> int:
             return -1, move
     return (-1, move) if turn == 'max' else (1, move)
 
-def minmax_ply(game: Nim) -> Nimply:
+def recursive_minmax_ply(game: Nim) -> Nimply:
     row_map = game_node_mapping(game)
     _, ply = nim_min_max(NimNode(game=game), 'min')
     return Nimply(row_map[ply.row], ply.num_objects)
 
+def table_path(n_rows: int) -> str:
+    """ Default path of the saved table of solved positions with n_rows rows, next to this file """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), f"nim_{n_rows}_rows.npy")
+
+@cache
+def saved_table(path: str, n_rows: int) -> SolvedTable:
+    """ Memory maps the table saved at path once, None if there is no such file """
+    return SolvedTable.load(path, n_rows) if os.path.exists(path) else None
+
+def minmax_ply(game: Nim, path: str = None) -> Nimply:
+    """
+        Looks up the table of solved positions saved at path (table_path by default), so that
+        it starts instantly. Without a saved table holding the position, a table is solved once
+        for each number of rows.
+    """
+    rows = game.rows
+    table = saved_table(table_path(len(rows)) if path is None else path, len(rows))
+    if table is None or table.n_values <= max(rows):
+        table = solved_table(len(rows), max(2 * len(rows), max(rows) + 1))
+    return table(game)
+
 if __name__ == '__main__':
-    game = Nim(5)
-    Duel(game, minmax_ply, top_ply, visible=True).play()
+    rows = 5
+    path = table_path(rows)
+    if not os.path.exists(path):
+        solved_table(rows, 2 * rows).save(path)
+    Duel(Nim(rows), minmax_ply, top_ply, visible=True).play()
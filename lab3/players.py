@@ -1,11 +1,25 @@
 import random
 import logging
+import threading
 import numpy as np
 from functools import reduce, partial
 from typing import Callable
 from operator import xor
 from game import Nim, Nimply
-from evolved_agents import SelfAdaptiveParameters
+from evolved_agents import SelfAdaptiveParameters, self_adaptive_offspring
+
+_local = threading.local()
+
+def generator() -> random.Random:
+    """ Random generator of the current thread, the global random module unless seeded with seed_generator """
+    return getattr(_local, "random", random)
+
+def seed_generator(seed: int = None) -> None:
+    """ Gives the current thread its own seeded generator, None restores the global random module """
+    if seed is None:
+        _local.__dict__.pop("random", None)
+    else:
+        _local.random = random.Random(seed)
 
 def good_ply(game: Nim) -> Nimply:
     """ Faulty nim-sum implementation, takes nim-sum to zero only if it can remove a whole row  """
@@ -33,8 +47,9 @@ def human_ply(game: Nim) -> Nimply:
     return Nimply(int(row), int(objects))
 
 def random_ply(game: Nim) -> Nimply:
-    row = random.choice([i for i, o in enumerate(game.rows) if o])
-    n_objects = random.randint(1, game.rows[row])
+    rand = generator()
+    row = rand.choice([i for i, o in enumerate(game.rows) if o])
+    n_objects = rand.randint(1, game.rows[row] if game.k is None else min(game.k, game.rows[row]))
     return Nimply(row, n_objects)
 
 def hardcoded_ply(game: Nim, default_ply: Callable = random_ply) -> Nimply:
@@ -55,61 +70,130 @@ def hardcoded_ply(game: Nim, default_ply: Callable = random_ply) -> Nimply:
         return default_ply(game)
 
 class AdaptiveRule:
-    """ Generic parametric rule """
+    """ Generic parametric rule, its parameters are max, min, priority and objects """
     def __init__(self, row: int, params: SelfAdaptiveParameters = None) -> None:
         if params is None:
             n_params = 4
             self._params = SelfAdaptiveParameters(np.random.random(n_params), np.full(n_params, 1))
         else:
             self._params = params
-        self._max = float(self._params[0])
-        self._min = float(self._params[1])
-        self._priority = float(self._params[2])
-        self._objects = round(self._params[3])
         self._row = row
    
     def tweak(self):
         return AdaptiveRule(self._row, params = self._params.tweak())    
 
+    def values(self) -> tuple:
+        """ (row, min, max, priority, objects) of the rule, parameters are converted only when needed """
+        maximum, minimum, priority, objects = self._params[:]
+        return self._row, float(minimum), float(maximum), float(priority), round(objects)
+
     def activation(self, game: Nim) -> tuple:
         """ Given a game returns a tuple inicating if its valid and its activation value """
+        _, minimum, maximum, priority, _ = self.values()
         row_elems = game.rows[self._row]
-        return row_elems > 0 and self._min < row_elems < self._max,  self._priority
+        return row_elems > 0 and minimum < row_elems < maximum,  priority
 
     def action(self, game: Nim) -> Nimply:
         row_elems = game.rows[self._row]
-        objects = min(max(1, self._objects), row_elems)
+        objects = min(max(1, self.values()[4]), row_elems)
         return Nimply(self._row, objects)
 
 class AdaptivePly:
-    """ Ply using only adaptive rules """
-    def __init__(self, n_rows: int, rules: list = None) -> None:
+    """
+        Ply using only adaptive rules. Rules are compiled once in a list sorted by priority, so the
+        chosen rule is the first valid one. With lookup the ply of every rows tuple of Nim(n_rows)
+        is computed at the first move, then moves are looked up.
+    """
+    def __init__(self, n_rows: int, rules: list = None, lookup: bool = False) -> None:
         self.__name__ = "adaptive_ply"
         if rules is None:
             self._rules = [AdaptiveRule(row) for row in range(n_rows) for _ in range(row + 1)]
         else:
             self._rules = rules
         self._n_rows = n_rows
+        self._lookup = lookup
+        self._compiled = None
+        self._plies = None
 
     def tweak(self):
         new_rules = [rule.tweak() for rule in self._rules]
-        return AdaptivePly(self._n_rows, rules=new_rules)
+        return AdaptivePly(self._n_rows, rules=new_rules, lookup=self._lookup)
+
+    def offspring(self, lambda_: int, generator: np.random.Generator) -> list:
+        """ lambda_ tweaks whose parameters are sampled at once as (lambda_, rules, 4) arrays """
+        params = [r._params for r in self._rules]
+        step = params[0]._step
+        values, sigmas = self_adaptive_offspring(
+            np.stack([p._v for p in params]), np.stack([p._sigma for p in params]), step, lambda_, generator
+        )
+        return [
+            AdaptivePly(self._n_rows, rules=[
+                AdaptiveRule(rule._row, SelfAdaptiveParameters(v, s, step=step+1, generator=generator))
+                for rule, v, s in zip(self._rules, child_values, child_sigmas)
+            ], lookup=self._lookup)
+            for child_values, child_sigmas in zip(values, sigmas)
+        ]
+
+    def rule_table(self) -> np.ndarray:
+        """ Rules as a (rules, 5) array with columns row, min, max, priority, objects """
+        params = np.array([r._params[:] for r in self._rules], dtype=float)
+        rows = np.array([r._row for r in self._rules], dtype=float)
+        return np.column_stack((rows, params[:, 1], params[:, 0], params[:, 2], np.round(params[:, 3])))
+
+    def compile(self) -> list:
+        """ (row, min, max, objects) of the rules by decreasing priority, equal priorities keep the rules order """
+        if self._compiled is None:
+            table = self.rule_table()
+            order = np.argsort(-table[:, 3], kind="stable")
+            self._compiled = [(int(row), minimum, maximum, int(objects)) for row, minimum, maximum, _, objects in table[order].tolist()]
+        return self._compiled
+
+    def lookup_table(self) -> tuple:
+        """ Rows and objects of the plies of every rows tuple, indexed by the mixed radix number of the rows """
+        if self._plies is None:
+            from batch import BatchAdaptivePly
+            sizes = [2*i + 2 for i in range(self._n_rows)]
+            games = np.indices(sizes).reshape(self._n_rows, -1).T
+            rows, objects = BatchAdaptivePly([self])(games, None)
+            self._plies = sizes, rows.tolist(), objects.tolist()
+        return self._plies
 
     def __call__(self, game: Nim) -> Nimply:
-        _, rule = max(((r.activation(game), r) for r in self._rules), key = lambda r: r[0])
-        return rule.action(game)
+        rows = game.rows
+        if self._lookup and len(rows) == self._n_rows:
+            sizes, ply_rows, ply_objects = self._plies if self._plies is not None else self.lookup_table()
+            index = 0
+            for elems, size in zip(rows, sizes):
+                if elems >= size:
+                    break
+                index = index * size + elems
+            else:
+                return Nimply(ply_rows[index], ply_objects[index])
+        rules = self._compiled if self._compiled is not None else self.compile()
+        for row, minimum, maximum, objects in rules:
+            elems = rows[row]
+            if elems and minimum < elems < maximum:
+                break
+        else:
+            # no valid rule, the one with highest priority is used
+            row, _, _, objects = rules[0]
+            elems = rows[row]
+        return Nimply(row, min(max(1, objects), elems))
 
 class HybridPly:
     """ Ply using if possible hardcoded rules otherwise adaptive rules """
-    def __init__(self, n_rows: int, algoritmic_ply: Callable, adaptive_ply: AdaptivePly = None) -> None:
+    def __init__(self, n_rows: int, algoritmic_ply: Callable, adaptive_ply: AdaptivePly = None, lookup: bool = False) -> None:
         self.__name__ = "hybrid_ply"
-        self._adaptive_ply = AdaptivePly(n_rows) if adaptive_ply is None else adaptive_ply
+        self._adaptive_ply = AdaptivePly(n_rows, lookup=lookup) if adaptive_ply is None else adaptive_ply
         self._algoritmic_ply = algoritmic_ply 
         self._ply = partial(algoritmic_ply, default_ply = self._adaptive_ply)
         self._num_rows = n_rows
 
     def tweak(self):
         return HybridPly(self._num_rows, self._algoritmic_ply, adaptive_ply = self._adaptive_ply.tweak())
+
+    def offspring(self, lambda_: int, generator: np.random.Generator) -> list:
+        return [HybridPly(self._num_rows, self._algoritmic_ply, adaptive_ply = a) for a in self._adaptive_ply.offspring(lambda_, generator)]
     
     def __call__(self, game: Nim) -> Nimply:
         return self._ply(game) 
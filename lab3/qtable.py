@@ -0,0 +1,75 @@
+import numpy as np
+from retrograde import CHUNK_SIZE, binomials, multisets
+
+
+class QTable:
+    """
+        Dense float32 quality table of Nim with n_rows rows holding less than n_values objects.
+        Positions are indexed by the rank of their sorted rows (see retrograde.py) and actions by
+        the id of their (row size, objects) pair, invalid actions are stored as -inf.
+    """
+
+    def __init__(self, n_rows: int, n_values: int = None, values: np.ndarray = None, seed: int = None) -> None:
+        self.n_rows = n_rows
+        self.n_values = 2 * n_rows if n_values is None else n_values
+        self._binomials = binomials(n_rows, self.n_values)
+        self._columns = np.arange(n_rows)
+        # action id of (size, objects) is size * (size - 1) / 2 + objects - 1
+        self.sizes = np.array([s for s in range(1, self.n_values) for _ in range(s)], dtype=np.uint8)
+        self.objects = np.array([o for s in range(1, self.n_values) for o in range(1, s + 1)], dtype=np.uint8)
+
+        positions = multisets(n_rows, self.n_values)
+        self.valid = np.empty((len(positions), len(self.sizes)), dtype=bool)
+        # rank of the position reached by each action, 0 (no objects left) for invalid ones too
+        self.next = np.empty(self.valid.shape, dtype=np.int32)
+        # the children of a chunk of positions take (positions, actions, rows) arrays
+        for start in range(0, len(positions), CHUNK_SIZE):
+            chunk = positions[start:start + CHUNK_SIZE]
+            matches = chunk[:, :, None] == self.sizes
+            valid = self.valid[start:start + CHUNK_SIZE] = matches.any(axis=1)
+            children = np.repeat(chunk[:, None, :], len(self.sizes), axis=1)
+            rows = np.argmax(matches, axis=1)
+            position_ids, action_ids = np.nonzero(valid)
+            children[position_ids, action_ids, rows[position_ids, action_ids]] -= self.objects[action_ids]
+            children.sort(axis=2)
+            self.next[start:start + CHUNK_SIZE] = np.where(valid, self._binomials[children, self._columns].sum(axis=2), 0)
+
+        if values is None:
+            values = np.random.default_rng(seed).random(self.valid.shape, dtype=np.float32)
+            values[~self.valid] = -np.inf
+        self.values = values
+
+    @staticmethod
+    def load(path: str, n_rows: int, mmap_mode: str = None) -> "QTable":
+        values = np.load(path, mmap_mode=mmap_mode)
+        n_values = next(v for v in range(1, 256) if v * (v - 1) // 2 >= values.shape[1])
+        return QTable(n_rows, n_values, values=values)
+
+    def save(self, path: str) -> None:
+        np.save(path, self.values)
+
+    def rank(self, rows: tuple) -> int:
+        return int(self._binomials[sorted(rows), self._columns].sum())
+
+    def action(self, size: int, objects: int) -> int:
+        return size * (size - 1) // 2 + objects - 1
+
+    def valid_actions(self, position: int) -> np.ndarray:
+        return np.flatnonzero(self.valid[position])
+
+    def best(self, positions):
+        """ Action with the highest quality of each position """
+        return np.argmax(self.values[positions], axis=-1)
+
+    def max_quality(self, positions):
+        """ Highest quality of each position, terminal positions have no valid actions and get -inf """
+        return np.max(self.values[positions], axis=-1)
+
+    def backup(self, positions: np.ndarray, actions: np.ndarray, targets: np.ndarray, alpha: float) -> None:
+        """ Moves the qualities of the (position, action) pairs towards the targets, repeated pairs are averaged """
+        pairs, inverse, counts = np.unique(
+            positions.astype(np.int64) * self.values.shape[1] + actions, return_inverse=True, return_counts=True
+        )
+        mean_targets = np.bincount(inverse, weights=targets, minlength=len(pairs)) / counts
+        flat = self.values.reshape(-1)
+        flat[pairs] = (1 - alpha) * flat[pairs] + alpha * mean_targets
@@ -0,0 +1,108 @@
+import numpy as np
+from functools import cache
+from itertools import chain, combinations_with_replacement
+from math import comb
+from game import Nim, Nimply
+
+CHUNK_SIZE = 4_096
+
+
+def binomials(n_rows: int, n_values: int) -> np.ndarray:
+    """
+        binomials[v, i] = C(v + i, i + 1): the rank of a sorted multiset a_0 <= ... <= a_n-1 is the sum
+        of binomials[a_i, i], a perfect hash of the multisets of n_rows values in [0, n_values)
+    """
+    return np.array([[comb(v + i, i + 1) for i in range(n_rows)] for v in range(n_values)], dtype=np.int64)
+
+
+def multisets(n_rows: int, n_values: int) -> np.ndarray:
+    """ All the sorted row tuples of n_rows values in [0, n_values), in rank order """
+    states = np.fromiter(
+        chain.from_iterable(combinations_with_replacement(range(n_values), n_rows)), dtype=np.uint8
+    ).reshape(-1, n_rows)
+    ranked = np.empty_like(states)
+    ranked[binomials(n_rows, n_values)[states, np.arange(n_rows)].sum(axis=1)] = states
+    return ranked
+
+
+class SolvedTable:
+    """
+        Solved positions of normal play Nim with n_rows rows holding less than n_values objects each.
+        Row i of the (positions, 3) uint8 table is indexed by the rank of the sorted rows and stores
+        whether the player to move wins, the size of the row to take from and the number of objects.
+    """
+
+    def __init__(self, n_rows: int, table: np.ndarray) -> None:
+        self.__name__ = "solved_ply"
+        self.n_rows = n_rows
+        self.n_values = next(v for v in range(1, 256) if comb(v + n_rows - 1, n_rows) >= len(table))
+        assert comb(self.n_values + n_rows - 1, n_rows) == len(table), "table size doesn't match the number of rows"
+        self.table = table
+        self._binomials = binomials(n_rows, self.n_values)
+        self._columns = np.arange(n_rows)
+
+    @staticmethod
+    def solve(n_rows: int, n_values: int) -> "SolvedTable":
+        """
+            Retrograde analysis: positions are solved by increasing number of objects, so that
+            every child is solved before its parents. A position is won if a move leads to a lost
+            one, the winning move taking the most objects is stored. Lost positions take one
+            object from the largest row.
+        """
+        assert n_values <= 256, "rows are stored as uint8"
+        states = multisets(n_rows, n_values)
+        ranks = binomials(n_rows, n_values)
+        columns = np.arange(n_rows)
+        table = np.zeros((len(states), 3), dtype=np.uint8)
+        table[:, 1], table[:, 2] = states[:, -1], 1
+        # every (row, objects) move of a position
+        rows, taken = (a.ravel() for a in np.meshgrid(columns, np.arange(1, n_values), indexing="ij"))
+        objects = states.sum(axis=1, dtype=np.int64)
+        order = np.argsort(objects, kind="stable")
+        start = 1
+        while start < len(order):
+            # a chunk never spans two levels, so the children of its positions are already solved
+            end = min(start + CHUNK_SIZE, np.searchsorted(objects[order], objects[order[start]], side="right"))
+            ids = order[start:end]
+            parents, moves = np.nonzero(states[ids][:, rows] >= taken)
+            children = states[ids[parents]]
+            children[np.arange(len(children)), rows[moves]] -= taken[moves].astype(np.uint8)
+            children.sort(axis=1)
+            winning = table[ranks[children, columns].sum(axis=1), 0] == 0
+            parents, moves = parents[winning], moves[winning]
+            # the last move of each parent, sorted by objects, takes the most
+            best = np.lexsort((taken[moves], parents))
+            parents, moves = parents[best], moves[best]
+            last = np.ones(len(parents), dtype=bool)
+            last[:-1] = parents[1:] != parents[:-1]
+            parents, moves = parents[last], moves[last]
+            won = ids[parents]
+            table[won, 0] = 1
+            table[won, 1] = states[won, rows[moves]]
+            table[won, 2] = taken[moves]
+            start = end
+        return SolvedTable(n_rows, table)
+
+    @staticmethod
+    def load(path: str, n_rows: int) -> "SolvedTable":
+        """ Memory maps a saved table, positions are read from disk only when looked up """
+        return SolvedTable(n_rows, np.load(path, mmap_mode="r"))
+
+    def save(self, path: str) -> None:
+        np.save(path, self.table)
+
+    def rank(self, rows: tuple) -> int:
+        return int(self._binomials[sorted(rows), self._columns].sum())
+
+    def wins(self, rows: tuple) -> bool:
+        """ True if the player to move wins from the given rows """
+        return bool(self.table[self.rank(rows), 0])
+
+    def __call__(self, game: Nim) -> Nimply:
+        _, size, objects = self.table[self.rank(game.rows)]
+        return Nimply(game.rows.index(size), int(objects))
+
+
+@cache
+def solved_table(n_rows: int, n_values: int) -> SolvedTable:
+    return SolvedTable.solve(n_rows, n_values)
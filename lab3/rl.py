@@ -1,46 +1,113 @@
 import random
-from copy import deepcopy
-from collections import defaultdict
+import numpy as np
 from typing import Callable
-from game import Nim, Nimply, Duel, NimNode, game_node_mapping
-from minmax import NimNode, game_node_mapping, nim_min_max
+from game import Nim, Nimply, Duel
+from qtable import QTable
+from batch import batch_player, simulate
 
 
+def linear_schedule(start: float, decay: float = 1e-5, minimum: float = 0.) -> Callable:
+    """ Explore rate decreasing by decay after every episode """
+    return lambda episode: max(minimum, start - decay * episode)
+
+def exponential_schedule(start: float, decay: float = .9995, minimum: float = .01) -> Callable:
+    """ Explore rate multiplied by decay after every episode """
+    return lambda episode: max(minimum, start * decay ** episode)
+
 
 class NimRLAgent:
-    def __init__(self, alpha: float = 0.15, gamma: float = 0.8, explore_rate: float = 0.2) -> None:
+    def __init__(self, alpha: float = 0.15, gamma: float = 0.8, explore_rate: float = 0.2, quality: QTable = None, schedule: Callable = None) -> None:
         self.__name__ = "rl_ply"
-        self._history = [] # state, move
+        self._history = [] # position, action
         self._weight = alpha
         self._discount = gamma
         self._explore_rate = explore_rate
-        self._quality = defaultdict(random.random)
+        # explore rate after the given number of episodes
+        self._schedule = linear_schedule(explore_rate) if schedule is None else schedule
+        self._episodes = 0
+        # the table is built on the first game when not given, its size depends on the number of rows
+        self._quality = quality
         self._training = True
 
+    def table(self, rows: tuple) -> QTable:
+        if self._quality is None:
+            self._quality = QTable(len(rows), max(2 * len(rows), max(rows) + 1), seed=random.getrandbits(32))
+        return self._quality
+
     def __call__(self, game: Nim) -> Nimply:
-        state = NimNode(game = game)
-        row_map = game_node_mapping(game)
-        possible_plies = state.possible_plies() 
+        quality = self.table(game.rows)
+        position = quality.rank(game.rows)
         if self._explore_rate >= random.random() and self._training:
-            ply = random.choice(list(possible_plies))
+            action = random.choice(quality.valid_actions(position))
         else:
-            ply = max(possible_plies, key = lambda p: self._quality[(state, p)])
+            action = quality.best(position)
         if self._training:
-            self._history.append((state, ply))
-        return Nimply(row_map[ply.row], ply.num_objects)
+            self._history.append((position, action))
+        return Nimply(game.rows.index(quality.sizes[action]), int(quality.objects[action]))
     
     def learn(self, has_won: bool) -> None:
-        for state, ply in reversed(self._history):
-            next_state = state.nimming(ply)
-            curr_quality = self._quality[state, ply]
-            reward = 1 if has_won else -1
-            if next_state:
-                next_quality = max(map(lambda p: self._quality[next_state, p], next_state.possible_plies()))
-            else:
-                next_quality = 1
-            self._quality[state, ply] =  (1 - self._weight)*curr_quality + self._weight*(reward + self._discount*next_quality)
+        values = self._quality.values
+        reward = 1 if has_won else -1
+        for position, action in reversed(self._history):
+            next_position = self._quality.next[position, action]
+            next_quality = self._quality.max_quality(next_position) if next_position else 1
+            values[position, action] = (1 - self._weight)*values[position, action] + self._weight*(reward + self._discount*next_quality)
         self._history.clear()
-        self._explore_rate -= 1e-5
+        self._episodes += 1
+        self._explore_rate = self._schedule(self._episodes)
+
+    def learn_batch(self, positions: np.ndarray, actions: np.ndarray, rewards: np.ndarray, episodes: int) -> None:
+        """ One backup of a batch of transitions, the targets use the qualities before the update """
+        quality = self._quality
+        next_positions = quality.next[positions, actions]
+        next_quality = np.where(next_positions > 0, quality.max_quality(next_positions), 1)
+        quality.backup(positions, actions, rewards + self._discount * next_quality, self._weight)
+        self._episodes += episodes
+        self._explore_rate = self._schedule(self._episodes)
+
+
+class ExperienceBuffer:
+    """ Circular buffer of the last (position, action, reward) transitions """
+    def __init__(self, capacity: int = 2 ** 16) -> None:
+        self.positions = np.zeros(capacity, dtype=np.int32)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self._size = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, positions: np.ndarray, actions: np.ndarray, rewards: np.ndarray) -> None:
+        capacity = len(self.positions)
+        slots = (self._next + np.arange(len(positions))) % capacity
+        self.positions[slots], self.actions[slots], self.rewards[slots] = positions, actions, rewards
+        self._next = (self._next + len(positions)) % capacity
+        self._size = min(capacity, self._size + len(positions))
+
+    def sample(self, n: int, rng: np.random.Generator) -> tuple:
+        ids = rng.integers(self._size, size=n)
+        return self.positions[ids], self.actions[ids], self.rewards[ids]
+
+
+class BatchAgentPly:
+    """ Epsilon greedy batch ply of an agent, it records the (game, position, action) of every move """
+    def __init__(self, quality: QTable, explore_rate: float) -> None:
+        self._quality = quality
+        self._explore_rate = explore_rate
+        self.moves = list()
+
+    def __call__(self, rows: np.ndarray, rng: np.random.Generator, ids: np.ndarray = None) -> tuple:
+        quality = self._quality
+        positions = quality._binomials[np.sort(rows, axis=1), quality._columns].sum(axis=1)
+        actions = quality.best(positions)
+        explore = rng.random(len(rows)) < self._explore_rate
+        if explore.any():
+            valid = quality.valid[positions[explore]]
+            actions[explore] = np.argmax(rng.random(valid.shape) * valid, axis=1)
+        self.moves.append((ids, positions, actions))
+        sizes = quality.sizes[actions]
+        return np.argmax(rows == sizes[:, None], axis=1), quality.objects[actions]
 
 class Trainer:
     def __init__(self, rows: int, adversary: Callable, agent: NimRLAgent = None) -> None:
@@ -62,12 +129,33 @@ class Trainer:
         self._agent._training = False
         return self._agent
 
+    def train_batch(self, episodes: int, n_envs: int = 100, batch_size: int = 2_048, buffer_size: int = 2 ** 16, seed: int = None) -> NimRLAgent:
+        """
+            Plays n_envs episodes at once on arrays, their transitions are pushed to an experience
+            buffer and after every round the agent learns from a batch sampled from the buffer
+        """
+        rng = np.random.default_rng(random.getrandbits(32) if seed is None else seed)
+        agent = self._agent
+        quality = agent.table(Nim(self._game_rows).rows)
+        adversary = batch_player(self._adv)
+        buffer = ExperienceBuffer(buffer_size)
+        for played in range(0, episodes, n_envs):
+            games = np.arange(min(n_envs, episodes - played))
+            ply = BatchAgentPly(quality, agent._explore_rate)
+            # as in train the agent starts the even episodes
+            won = simulate(ply, adversary, self._game_rows, (played + games) % 2, games, rng)
+            ids, positions, actions = (np.concatenate(a) for a in zip(*ply.moves))
+            buffer.push(positions, actions, np.where(won[ids], 1, -1))
+            agent.learn_batch(*buffer.sample(min(batch_size, len(buffer)), rng), len(games))
+        agent._training = False
+        return agent
+
 if __name__ == '__main__':
-    import numpy as np
     from evolved_agents import nim_fitness
     from players import random_ply, hardcoded_ply, human_ply, good_ply
     rows = 4
-    agent_ply = Trainer(rows, hardcoded_ply).train(10_000)
+    agent = NimRLAgent(schedule=exponential_schedule(.2, decay=.9998))
+    agent_ply = Trainer(rows, hardcoded_ply, agent).train_batch(10_000)
     print("Against hardcoded_ply", nim_fitness(agent_ply, adversary = hardcoded_ply, rows=rows, n_games = 1000))
     print("Against random_ply", nim_fitness(agent_ply, adversary = random_ply, rows=rows, n_games = 1000))
     print("Against good_ply", nim_fitness(agent_ply, adversary = good_ply, rows=rows, n_games = 1000))
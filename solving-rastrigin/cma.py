@@ -0,0 +1,164 @@
+import logging
+from collections import namedtuple
+from problems import sphere, rastrigin
+import numpy as np
+
+SEED = 42
+
+logging.basicConfig(
+    format="[%(asctime)s] %(levelname)s: %(message)s",
+    datefmt="%H:%M:%S",
+    level=logging.INFO,
+)
+
+Solution = namedtuple("Solution", "parameters, fitness, evaluations")
+
+
+class CMA:
+    """
+        Covariance matrix adaptation evolution strategy maximizing a fitness. The separable variant
+        adapts only the diagonal of the covariance, O(d) instead of O(d^2) per offspring, with the
+        faster learning rates of sep-CMA-ES. Offspring are sampled with ask() as a (lambda, d) matrix
+        and their fitnesses are given back with tell().
+    """
+
+    def __init__(self, x0, sigma0, lambda_=None, separable=False, generator=None):
+        n = len(x0)
+        self.n = n
+        self.separable = separable
+        self.generator = np.random.default_rng() if generator is None else generator
+        self.lambda_ = 4 + int(3 * np.log(n)) if lambda_ is None else lambda_
+        self.mu = self.lambda_ // 2
+        weights = np.log(self.mu + .5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / np.sum(self.weights ** 2)
+
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+        if separable:
+            self.c1, self.cmu = (min(1, c * (n + 2) / 3) for c in (self.c1, self.cmu))
+            self.cmu = min(self.cmu, 1 - self.c1)
+        self.damps = 1 + 2 * max(0, np.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        sigma0 = np.broadcast_to(np.asarray(sigma0, dtype=float), (n,))
+        self.sigma = float(sigma0.mean())
+        self.mean = np.array(x0, dtype=float)
+        self.ps = np.zeros(n)
+        self.pc = np.zeros(n)
+        # the covariance is B diag(D^2) B^T, B is None in the separable variant
+        self.D = sigma0 / self.sigma
+        self.C = self.D ** 2 if separable else np.diag(self.D ** 2)
+        self.B = None if separable else np.eye(n)
+        self._decomposed = 0
+        self.generation = 0
+        self._y = None
+
+    def ask(self):
+        z = self.generator.standard_normal((self.lambda_, self.n))
+        self._y = z * self.D if self.separable else (z * self.D) @ self.B.T
+        return self.mean + self.sigma * self._y
+
+    def tell(self, fitnesses):
+        """ Updates the distribution given the fitnesses of the last offspring returned by ask() """
+        order = np.argsort(-np.asarray(fitnesses), kind="stable")[:self.mu]
+        y = self._y[order]
+        y_w = self.weights @ y
+        self.mean = self.mean + self.sigma * y_w
+        self.generation += 1
+
+        inv_sqrt_y = y_w / self.D if self.separable else self.B @ ((self.B.T @ y_w) / self.D)
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mueff) * inv_sqrt_y
+        ps_norm = np.linalg.norm(self.ps)
+        hsig = ps_norm / np.sqrt(1 - (1 - self.cs) ** (2 * self.generation)) / self.chi_n < 1.4 + 2 / (self.n + 1)
+        self.pc = (1 - self.cc) * self.pc + hsig * np.sqrt(self.cc * (2 - self.cc) * self.mueff) * y_w
+
+        decay = 1 - self.c1 - self.cmu + (1 - hsig) * self.c1 * self.cc * (2 - self.cc)
+        if self.separable:
+            self.C = decay * self.C + self.c1 * self.pc ** 2 + self.cmu * (self.weights @ y ** 2)
+            self.D = np.sqrt(self.C)
+        else:
+            self.C = decay * self.C + self.c1 * np.outer(self.pc, self.pc) + self.cmu * (y.T * self.weights) @ y
+            # the eigendecomposition is O(d^3), it is refreshed only when C changed enough
+            if self.generation - self._decomposed > self.lambda_ / (self.c1 + self.cmu) / self.n / 10:
+                self._decomposed = self.generation
+                self.C = np.triu(self.C) + np.triu(self.C, 1).T
+                eigenvalues, self.B = np.linalg.eigh(self.C)
+                self.D = np.sqrt(np.maximum(eigenvalues, 1e-300))
+        self.sigma *= np.exp(self.cs / self.damps * (ps_norm / self.chi_n - 1))
+
+    def condition(self):
+        return (self.D.max() / self.D.min()) ** 2
+
+    def converged(self, tolx=1e-12):
+        return self.sigma * self.D.max() < tolx or self.condition() > 1e14 or not np.isfinite(self.sigma)
+
+
+def cma_es(x0, sigma0, fitness, epochs, seed=None, separable=False, restarts=None, max_restarts=9, target=None, max_evaluations=None):
+    """
+        CMA-ES maximizing fitness, called once per generation on the (d, lambda) matrix of the offspring
+        as one_lambda. epochs and max_evaluations bound the whole run, restarts ('ipop' or 'bipop') begin
+        from x0 when a run converged or stagnated: IPOP doubles the population at each restart, BIPOP
+        alternates those runs with small population, small step size ones, spending a similar budget.
+        Returns the best solution found and the history of improvements as one_lambda.
+    """
+    assert restarts in (None, 'ipop', 'bipop'), f"Unknown restart strategy {restarts}"
+    generator = np.random.default_rng(seed)
+    x0 = np.asarray(x0, dtype=float)
+    default_lambda = 4 + int(3 * np.log(len(x0)))
+    best, hist = Solution(x0, fitness(x0), 1), list()
+    epoch, evaluations = 0, 1
+    budgets = {'large': 0, 'small': 0}
+    large_restarts, runs = 0, 0
+    while True:
+        # only the restarts with large populations are counted, as in BIPOP
+        regime, sigma = 'large', sigma0
+        if restarts == 'bipop' and runs > 0 and budgets['small'] < budgets['large']:
+            regime = 'small'
+            lambda_ = int(default_lambda * (.5 * 2 ** large_restarts) ** (generator.random() ** 2))
+            sigma = np.asarray(sigma0) * 10 ** (-2 * generator.random())
+        elif runs > 0:
+            if restarts is None or large_restarts == max_restarts:
+                break
+            large_restarts += 1
+        if regime == 'large':
+            lambda_ = default_lambda * 2 ** large_restarts
+        runs += 1
+        strategy = CMA(x0, sigma, lambda_=max(lambda_, default_lambda), separable=separable, generator=generator)
+        recent = list()
+        stagnation = 10 + int(np.ceil(30 * strategy.n / strategy.lambda_))
+        logging.debug(f"run {runs} ({regime}) lambda {strategy.lambda_}")
+        while epoch < epochs and (max_evaluations is None or evaluations < max_evaluations):
+            offspring = strategy.ask()
+            fitnesses = fitness(offspring.T)
+            strategy.tell(fitnesses)
+            epoch += 1
+            evaluations += strategy.lambda_
+            budgets[regime] += strategy.lambda_
+            i = int(np.argmax(fitnesses))
+            if fitnesses[i] > best.fitness:
+                best = Solution(offspring[i], fitnesses[i], evaluations)
+                hist.append((best, epoch))
+            if target is not None and best.fitness >= target:
+                return best, hist
+            recent.append(fitnesses[i])
+            if strategy.converged(1e-12 * np.max(sigma0)) or (
+                len(recent) > stagnation and max(recent[-stagnation:]) - min(recent[-stagnation:]) < 1e-12
+            ):
+                break
+        else:
+            break
+    return best, hist
+
+
+if __name__ == '__main__':
+    for d in (2, 10, 100):
+        for name, problem in (("sphere", sphere), ("rastrigin", rastrigin)):
+            for separable in (False, True):
+                best, _ = cma_es(
+                    np.full(d, 3.), 2., problem, 10 ** 5, seed=SEED, separable=separable, restarts='ipop',
+                    target=-1e-8, max_evaluations=10 ** 6,
+                )
+                logging.info(f"d={d} {name} {'sep-' if separable else ''}CMA fitness {best.fitness:.3g} after {best.evaluations:,} evaluations")
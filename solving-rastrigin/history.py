@@ -0,0 +1,63 @@
+import struct
+import numpy as np
+
+
+class HistoryRecorder:
+    """
+        Streams (epoch, fitness, sigma_norm, coordinates) records to an append-only .npy file, keeping
+        in memory only a small buffer. The header has a fixed size and is rewritten with the number of
+        records on every flush, so the file can be read, also memory mapped, with np.load.
+        coordinates holds n_coordinates evenly spaced coordinates of x, none by default.
+    """
+
+    def __init__(self, path, dimensions, n_coordinates=0, buffer_size=1024):
+        self.dtype = np.dtype([
+            ("epoch", np.int64),
+            ("fitness", np.float64),
+            ("sigma_norm", np.float64),
+            ("coordinates", np.float32, (n_coordinates,)),
+        ])
+        self._indices = np.linspace(0, dimensions - 1, n_coordinates).astype(np.intp)
+        self._buffer = np.zeros(buffer_size, dtype=self.dtype)
+        self._buffered = 0
+        self.records = 0
+        # room for any number of records, rounded up to the 64 bytes alignment of the format
+        self._header_size = -(-(len(self._header_text(10 ** 19)) + 11) // 64) * 64
+        self._file = open(path, "wb")
+        self._file.write(self._header())
+        # a valid .npy with no records until the first flush
+        self._file.flush()
+
+    def _header_text(self, records):
+        descr = np.lib.format.dtype_to_descr(self.dtype)
+        return "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (descr, records)
+
+    def _header(self):
+        text = self._header_text(self.records).ljust(self._header_size - 11) + "\n"
+        return np.lib.format.magic(1, 0) + struct.pack("<H", len(text)) + text.encode("latin1")
+
+    def record(self, epoch, fitness, sigma, x):
+        self._buffer[self._buffered] = (epoch, fitness, np.linalg.norm(sigma), x[self._indices])
+        self._buffered += 1
+        if self._buffered == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        self._file.write(self._buffer[:self._buffered].tobytes())
+        self.records += self._buffered
+        self._buffered = 0
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.seek(0, 2)
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -5,4 +5,4 @@ def rastrigin(x, A=10):
     return -np.sum(A - A * np.cos(2 * np.pi * x) + x**2, axis=0)
 
 def sphere(x):
-    return -np.sum(x ** 2)
+    return -np.sum(x ** 2, axis=0)
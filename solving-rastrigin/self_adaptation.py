@@ -1,70 +1,91 @@
-import logging
+import os
 from problems import sphere, rastrigin 
 import numpy as np
 
 SEED = 42
 
-logging.basicConfig(
-    format="[%(asctime)s] %(levelname)s: %(message)s",
-    datefmt="%H:%M:%S",
-    level=logging.INFO,
-)
+def self_adaptive_offspring(v, sigma, step, lambda_, generator, out=None):
+    """
+        Values and sigmas of lambda_ tweaks of (v, sigma) as (lambda_, *v.shape) arrays drawn from a single
+        generator. They are drawn in place in the float32 or float64 (values, sigmas) buffers of out if given,
+        new float64 arrays otherwise.
+    """
+    if out is None:
+        out = np.empty((lambda_, *v.shape)), np.empty((lambda_, *v.shape))
+    values, sigmas = out
+    # same draws as sigma * exp(tau * normal()) and normal(loc=v, scale=sigma)
+    generator.standard_normal(out=sigmas, dtype=sigmas.dtype)
+    sigmas *= 1 / (step ** .5)
+    np.exp(sigmas, out=sigmas)
+    sigmas *= sigma
+    generator.standard_normal(out=values, dtype=values.dtype)
+    values *= sigma
+    values += v
+    return values, sigmas
 
 class SelfAdaptive:
-    def __init__(self, initial_point: np.ndarray, sigma: np.ndarray, seed=None, step = 1):
-        self.generator = np.random.default_rng(seed)
+    def __init__(self, initial_point: np.ndarray, sigma: np.ndarray, seed=None, step = 1, generator=None):
+        self.generator = np.random.default_rng(seed) if generator is None else generator
         self.v = initial_point
         self.shape = initial_point.shape
         self.sigma = sigma
         self.step = step        
 
-    def tweak(self):
-        tau = 1 / (self.step ** .5)
-        seed = self.generator.integers(2 ** 10)
-        sigma = self.sigma * np.exp(tau * self.generator.normal(size = self.shape))
-        value = self.generator.normal(loc=self.v, scale=self.sigma)
-        return SelfAdaptive(value, sigma, seed=seed, step=self.step+1)
-        
     @property
     def parameters(self) -> np.ndarray:
         return self.v
 
 
-def one_lambda(x0, sigma0, lambda_, fitness, epochs, seed=None, strategy=','):
-    one = SelfAdaptive(x0, sigma0, seed=seed)
-    best = one
-    population, hist = list(), list()
+def one_lambda(x0, sigma0, lambda_, fitness, epochs, seed=None, strategy=',', recorder=None, dtype=np.float64):
+    """
+        (1, lambda) or (1 + lambda) self-adaptive ES. The fitness is called once per epoch on the
+        (d, lambda) matrix of the offspring, one column each, as problems.rastrigin and problems.sphere.
+        Offspring are drawn in place in preallocated (lambda, d) buffers of the given dtype, so memory
+        stays O(lambda d). Improvements are streamed to the recorder if given (see history.py),
+        otherwise they are returned in the history.
+    """
+    generator = np.random.default_rng(seed)
+    v = np.array(x0, dtype=dtype)
+    sigma = np.broadcast_to(np.asarray(sigma0, dtype=dtype), v.shape).copy()
+    buffers = np.empty((lambda_, *v.shape), dtype=dtype), np.empty((lambda_, *v.shape), dtype=dtype)
+    best_v, best_sigma = v.copy(), sigma.copy()
+    step = best_step = 1
+    one_fitness = best_fitness = fitness(v)
+    hist = list()
     for epoch in range(epochs):
-        for _ in range(lambda_):
-            new = one.tweak()
-            population.append((fitness(new.parameters), new))
-        if strategy in ['plus', '+']:
-            one.step += 1
-            population.append((fitness(one.parameters), one))
-        fit, one = max(population)
-        if fit > fitness(best.parameters):
-            hist.append((one, epoch))
-            best = one
-        population.clear()
-    return best, hist
+        values, sigmas = self_adaptive_offspring(v, sigma, step, lambda_, generator, out=buffers)
+        fitnesses = fitness(values.T)
+        i = int(np.argmax(fitnesses))
+        # a surviving parent ages as its offspring would
+        step += 1
+        if strategy not in ['plus', '+'] or fitnesses[i] >= one_fitness:
+            v[:], sigma[:], one_fitness = values[i], sigmas[i], fitnesses[i]
+        if one_fitness > best_fitness:
+            best_v[:], best_sigma[:], best_fitness, best_step = v, sigma, one_fitness, step
+            if recorder is None:
+                hist.append((SelfAdaptive(v.copy(), sigma.copy(), step=step, generator=generator), epoch))
+            else:
+                recorder.record(epoch, one_fitness, sigma, v)
+    return SelfAdaptive(best_v, best_sigma, step=best_step, generator=generator), hist
             
 
 if __name__ == '__main__':
     import matplotlib.pyplot as plt
+    from history import HistoryRecorder
     x0 = np.full(2, 100)
     sigma0 = np.full(2, 10)
     goal = np.zeros((1,2))
-    best, hist = one_lambda(x0, sigma0, 1000, rastrigin, 10 ** 3, seed=SEED, strategy='+')
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.npy")
+    with HistoryRecorder(path, len(x0), n_coordinates=len(x0)) as recorder:
+        best, _ = one_lambda(x0, sigma0, 1000, rastrigin, 10 ** 3, seed=SEED, strategy='+', recorder=recorder)
     print(np.linalg.norm(best.parameters - goal), rastrigin(best.parameters))
-    values, epochs = zip(*hist) 
-    pos = np.array(list(map(lambda x: x.parameters, values)))
-    errors = np.linalg.norm(pos - goal, axis = 1)
-    minus_rast = -rastrigin(pos.T)
+    hist = np.load(path, mmap_mode="r")
+    errors = np.linalg.norm(hist["coordinates"] - goal, axis = 1)
+    minus_rast = -hist["fitness"]
 
-    plt.semilogy(epochs, errors, 'b', marker='.', label='distance of x from solution')
-    plt.semilogy(epochs, minus_rast, 'r', marker='*', label='- rastrigin(x)')
+    plt.semilogy(hist["epoch"], errors, 'b', marker='.', label='distance of x from solution')
+    plt.semilogy(hist["epoch"], minus_rast, 'r', marker='*', label='- rastrigin(x)')
     plt.title('Fittest elements')
     plt.xlabel('epoch')
     plt.legend()
     plt.show()
-    